@@ -3,23 +3,59 @@ Main Flask Application for Face Recognition Attendance System
 Optimized for West African employees
 """
 from flask import Flask, render_template
+from flask.json.provider import JSONProvider
 from flask_cors import CORS
 from config import Config
-from models import db
+from models import db, ensure_indexes
+import atexit
+import importlib
 import logging
-from logging.handlers import RotatingFileHandler
+from logging.handlers import MemoryHandler, RotatingFileHandler
 from pathlib import Path
-
-# Import routes
-from routes.dashboard import dashboard_bp
-from routes.enrollment import enrollment_bp
-from routes.attendance import attendance_bp
+import decimal
+import orjson
+
+# Blueprints as (module, attribute, url_prefix); modules are imported in create_app
+BLUEPRINTS = (
+    ('routes.dashboard', 'dashboard_bp', None),
+    ('routes.enrollment', 'enrollment_bp', '/enroll'),
+    ('routes.attendance', 'attendance_bp', '/attendance'),
+)
+
+
+class OrjsonProvider(JSONProvider):
+    """Flask JSON provider backed by orjson (native datetime and numpy support, bytes output)"""
+
+    # numpy arrays and scalars (np.float32, np.bool_, ...) serialize without manual conversion
+    options = orjson.OPT_SERIALIZE_NUMPY
+
+    @staticmethod
+    def _default(obj):
+        if isinstance(obj, decimal.Decimal):
+            return str(obj)
+        if hasattr(obj, '__html__'):
+            return str(obj.__html__())
+        raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+    def dumps(self, obj, **kwargs) -> str:
+        return orjson.dumps(obj, default=self._default, option=self.options).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            orjson.dumps(obj, default=self._default, option=self.options),
+            mimetype='application/json'
+        )
 
 
 def create_app(config_class=Config):
     """Application factory"""
     app = Flask(__name__)
     app.config.from_object(config_class)
+    app.json = OrjsonProvider(app)
 
     # Initialize extensions
     db.init_app(app)
@@ -32,13 +68,18 @@ def create_app(config_class=Config):
     setup_logging(app)
 
     # Register blueprints
-    app.register_blueprint(dashboard_bp)
-    app.register_blueprint(enrollment_bp, url_prefix='/enroll')
-    app.register_blueprint(attendance_bp, url_prefix='/attendance')
+    for module_name, attr, url_prefix in BLUEPRINTS:
+        blueprint = getattr(importlib.import_module(module_name), attr)
+        app.register_blueprint(blueprint, url_prefix=url_prefix)
+
+    # Socket.IO channel for streaming enrollment preview frames
+    socketio = importlib.import_module('routes.realtime').socketio
+    socketio.init_app(app, async_mode=app.config['SOCKETIO_ASYNC_MODE'], cors_allowed_origins='*')
 
     # Create database tables
     with app.app_context():
         db.create_all()
+        ensure_indexes()
         app.logger.info("Database tables created")
 
     # Favicon route
@@ -78,7 +119,17 @@ def setup_logging(app):
             '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'
         ))
         file_handler.setLevel(logging.INFO)
-        app.logger.addHandler(file_handler)
+
+        # Buffer records in memory; flush on ERROR, when full, or at exit
+        memory_handler = MemoryHandler(
+            capacity=1000,
+            flushLevel=logging.ERROR,
+            target=file_handler,
+            flushOnClose=True
+        )
+        memory_handler.setLevel(logging.INFO)
+        atexit.register(memory_handler.flush)
+        app.logger.addHandler(memory_handler)
 
     app.logger.setLevel(logging.INFO)
     app.logger.info('Face Recognition Attendance System startup')
@@ -86,4 +137,4 @@ def setup_logging(app):
 
 if __name__ == '__main__':
     app = create_app()
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    app.extensions['socketio'].run(app, debug=True, host='0.0.0.0', port=5000)
@@ -15,18 +15,38 @@ class Config:
     DEBUG = True
 
     # Database settings
-    SQLALCHEMY_DATABASE_URI = f"sqlite:///{BASE_DIR / 'data' / 'attendance.db'}"
+    # Default engine is the single read-write connection; the 'ro' bind is a
+    # read-only pool for the recognition and reporting read paths
+    DATABASE_PATH = BASE_DIR / 'data' / 'attendance.db'
+    SQLALCHEMY_DATABASE_URI = f"sqlite:///{DATABASE_PATH}"
+    SQLALCHEMY_BINDS = {
+        'ro': {
+            'url': f"sqlite:///file:{DATABASE_PATH.as_posix()}?mode=ro&uri=true",
+            'pool_size': 5
+        }
+    }
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_pre_ping': True,
+        'pool_size': 1,
+        'max_overflow': 0,  # Hard cap: other writers wait for the connection instead of opening more
+        'connect_args': {'check_same_thread': False, 'timeout': 5}
+    }
 
     # File storage paths
     ENROLLED_FACES_DIR = BASE_DIR / 'static' / 'enrolled_faces'
     ATTENDANCE_IMAGES_DIR = BASE_DIR / 'static' / 'attendance_images'
     LOGS_DIR = BASE_DIR / 'data' / 'logs'
+    GALLERY_PATH = BASE_DIR / 'data' / 'gallery.npy'  # Recognition gallery snapshot (kept out of static/)
 
     # Face recognition settings
     FACE_MODEL_NAME = 'buffalo_l'  # Best for diverse faces including West African
     FACE_DETECTION_THRESHOLD = 0.5
+    FACE_DETECTION_SIZE = 640  # InsightFace det_size; frames larger than this are decoded at reduced scale
+    PREVIEW_DECODE_SIZE = 320  # Enrollment preview frames are decoded at reduced scale down to this size
     FACE_RECOGNITION_THRESHOLD = 0.30  # Calibrated for West African faces (0.25-0.30)
+    FACE_NUM_THREADS = None  # ONNX Runtime intra-op threads (None = all cores)
+    FACE_EXECUTION_PROVIDERS = ['CUDAExecutionProvider', 'CPUExecutionProvider']  # GPU used when available
 
     # Image quality thresholds (heavily relaxed for basic webcams and varied lighting)
     MIN_BLUR_THRESHOLD = 20.0  # Very relaxed - works with basic webcams
@@ -36,11 +56,21 @@ class Config:
     MIN_FACE_SIZE = 0.08  # Allows slightly smaller faces
     MAX_FACE_SIZE = 0.70  # Face must not exceed 70% of frame
     MAX_CENTER_OFFSET = 0.20  # Face center within 20% of frame center
+    # The blur/brightness/contrast thresholds above are tuned on whole-frame statistics.
+    # Face-box statistics have different distributions (e.g. no dark background pulling
+    # contrast up), so keep this off until the thresholds are re-derived from face-region
+    # measurements of sample captures
+    QUALITY_USE_FACE_REGION = False  # Measure the pixel checks on the face box instead of the whole frame
+    QUALITY_USE_OPENCL = False  # Run the pixel checks on an OpenCL device when OpenCV has one
 
     # Head pose thresholds with INTENTIONAL OVERLAPS to prevent dead zones
     # 5° overlap between front and left/right ensures smooth transitions
     # Yaw: negative = head turned LEFT, positive = head turned RIGHT
     # Pitch: negative = head tilted DOWN, positive = head tilted UP
+    # Gate guided capture on POSE_REQUIREMENTS. Off by default: the PnP estimator returned
+    # inverted angles (e.g. yaw=-169° for a frontal face), so readiness uses quality checks only
+    ENFORCE_POSE_REQUIREMENTS = False
+    POSE_USE_PNP = False  # True: solvePnP head pose (calibration); False: closed-form from landmarks
     POSE_REQUIREMENTS = {
         'front': {'yaw': (-30, 30), 'pitch': (-25, 25)},      # Wide front zone
         'left': {'yaw': (-70, -25), 'pitch': (-25, 25)},      # 5° overlap with front (-30 to -25)
@@ -52,10 +82,14 @@ class Config:
     # Enrollment settings - simplified to essentials for faster, more reliable enrollment
     REQUIRED_POSES = ['front', 'left', 'right']  # Removed 'up', 'down' - focus on essentials
     CAPTURE_COUNTDOWN = 3  # Seconds before auto-capture
+    MAX_CONCURRENT_VALIDATIONS = 2  # Preview frames validated at once; extra frames are dropped
+    SOCKETIO_ASYNC_MODE = 'threading'  # Preview frames are streamed over Socket.IO (HTTP polling fallback)
 
     # Performance settings
+    SERVER_THREADS = 8  # Waitress worker threads (run.py); preview frames run alongside dashboard queries
     MAX_EMPLOYEES = 100  # POC limit
     RECOGNITION_TIMEOUT = 2  # Seconds
+    STATS_CACHE_TTL = 30  # Seconds dashboard statistics are served from cache
 
     # Create directories if they don't exist
     @staticmethod
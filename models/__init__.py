@@ -1,4 +1,4 @@
 """Models package initialization"""
-from .database import db, Employee, FaceEncoding, Attendance
+from .database import db, Employee, FaceEncoding, Attendance, read_only_bind, ensure_indexes
 
-__all__ = ['db', 'Employee', 'FaceEncoding', 'Attendance']
+__all__ = ['db', 'Employee', 'FaceEncoding', 'Attendance', 'read_only_bind', 'ensure_indexes']
@@ -2,12 +2,56 @@
 Database models for the Face Recognition Attendance System
 """
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.schema import CreateIndex
 from datetime import datetime
 import pickle
+import sqlite3
 import numpy as np
 
 db = SQLAlchemy()
 
+# Name of the read-only SQLite connection pool in SQLALCHEMY_BINDS
+READ_ONLY_BIND = 'ro'
+
+# Applied to every new SQLite connection: WAL lets readers run alongside the
+# attendance writer, and synchronous=NORMAL avoids a full fsync per commit
+SQLITE_PRAGMAS = (
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA busy_timeout=5000',
+    'PRAGMA cache_size=-20000',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA foreign_keys=ON',
+)
+
+
+@event.listens_for(Engine, 'connect')
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Tune SQLite connections as they are opened"""
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+
+    cursor = dbapi_connection.cursor()
+
+    # journal_mode is persistent, so only switch it once; read-only
+    # connections cannot change it and simply inherit WAL
+    cursor.execute('PRAGMA journal_mode')
+    if cursor.fetchone()[0] != 'wal':
+        cursor.execute('PRAGMA journal_mode=WAL')
+
+    for pragma in SQLITE_PRAGMAS:
+        cursor.execute(pragma)
+    cursor.close()
+
+
+def read_only_bind() -> dict:
+    """Session bind arguments that route a query to the read-only pool"""
+    return {'bind': db.engines[READ_ONLY_BIND]}
+
+# Face embeddings are stored as raw float16 bytes (1 KB per 512-dim embedding)
+ENCODING_DTYPE = np.float16
+
 
 class Employee(db.Model):
     """Employee model for storing employee information"""
@@ -22,12 +66,22 @@ class Employee(db.Model):
     enrolled_at = db.Column(db.DateTime, default=datetime.utcnow)
     is_active = db.Column(db.Boolean, default=True)
 
+    __table_args__ = (
+        # Covering index for active-employee counts and lookups
+        db.Index('ix_employees_active', 'is_active', 'employee_id'),
+    )
+
     # Relationships
     face_encodings = db.relationship('FaceEncoding', backref='employee', lazy=True, cascade='all, delete-orphan')
     attendance_records = db.relationship('Attendance', backref='employee', lazy=True)
 
-    def to_dict(self):
-        """Convert employee to dictionary"""
+    def to_dict(self, face_count: int = None):
+        """
+        Convert employee to dictionary (datetimes are serialized by the JSON provider)
+
+        Args:
+            face_count: Number of face encodings, if already queried (otherwise the relationship is loaded)
+        """
         return {
             'id': self.id,
             'employee_id': self.employee_id,
@@ -35,9 +89,9 @@ class Employee(db.Model):
             'department': self.department,
             'email': self.email,
             'phone': self.phone,
-            'enrolled_at': self.enrolled_at.isoformat() if self.enrolled_at else None,
+            'enrolled_at': self.enrolled_at,
             'is_active': self.is_active,
-            'face_count': len(self.face_encodings)
+            'face_count': len(self.face_encodings) if face_count is None else face_count
         }
 
 
@@ -47,29 +101,37 @@ class FaceEncoding(db.Model):
 
     id = db.Column(db.Integer, primary_key=True)
     employee_id = db.Column(db.String(50), db.ForeignKey('employees.employee_id'), nullable=False, index=True)
-    encoding = db.Column(db.LargeBinary, nullable=False)  # Pickled numpy array
+    encoding = db.Column(db.LargeBinary, nullable=False)  # Raw float16 bytes (legacy rows: pickled numpy array)
     image_path = db.Column(db.String(500))
     pose_type = db.Column(db.String(20))  # 'front', 'left', 'right', 'up', 'down'
     quality_score = db.Column(db.Float)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     def set_encoding(self, encoding_array: np.ndarray):
-        """Store numpy array as pickled binary"""
-        self.encoding = pickle.dumps(encoding_array)
+        """Store numpy array as raw float16 bytes"""
+        self.encoding = np.ascontiguousarray(encoding_array, dtype=ENCODING_DTYPE).tobytes()
 
     def get_encoding(self) -> np.ndarray:
-        """Retrieve numpy array from pickled binary"""
-        return pickle.loads(self.encoding)
+        """Retrieve numpy array from stored binary"""
+        return self.decode_encoding(self.encoding)
+
+    @staticmethod
+    def decode_encoding(data: bytes) -> np.ndarray:
+        """Decode a stored encoding column value into a float32 numpy array"""
+        # Rows enrolled before the float16 format still hold pickled arrays
+        if data[:1] == b'\x80' and b'numpy' in data[:64]:
+            return np.asarray(pickle.loads(data), dtype=np.float32)
+        return np.frombuffer(data, dtype=ENCODING_DTYPE).astype(np.float32)
 
     def to_dict(self):
-        """Convert face encoding to dictionary"""
+        """Convert face encoding to dictionary (datetimes are serialized by the JSON provider)"""
         return {
             'id': self.id,
             'employee_id': self.employee_id,
             'image_path': self.image_path,
             'pose_type': self.pose_type,
             'quality_score': self.quality_score,
-            'created_at': self.created_at.isoformat() if self.created_at else None
+            'created_at': self.created_at
         }
 
 
@@ -85,14 +147,31 @@ class Attendance(db.Model):
     status = db.Column(db.String(20), default='present')
     image_path = db.Column(db.String(500))
 
+    __table_args__ = (
+        # Covers the "checked in within the last hour" lookup per employee
+        db.Index('ix_attendance_emp_ts', 'employee_id', 'timestamp'),
+        # Expression index for per-day queries on date(timestamp)
+        db.Index('ix_attendance_date', db.func.date(timestamp)),
+    )
+
     def to_dict(self):
-        """Convert attendance record to dictionary"""
+        """Convert attendance record to dictionary (datetimes are serialized by the JSON provider)"""
         return {
             'id': self.id,
             'employee_id': self.employee_id,
             'employee_name': self.employee_name,
-            'timestamp': self.timestamp.isoformat() if self.timestamp else None,
+            'timestamp': self.timestamp,
             'confidence': self.confidence,
             'status': self.status,
             'image_path': self.image_path
         }
+
+
+def ensure_indexes():
+    """Create model indexes missing from tables that predate them (create_all skips existing tables)"""
+    # IF NOT EXISTS instead of checkfirst: SQLite reflection skips expression
+    # indexes such as ix_attendance_date, so checkfirst never sees them
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                conn.execute(CreateIndex(index, if_not_exists=True))
@@ -2,43 +2,107 @@
 Face Recognition Engine using InsightFace
 Optimized for West African faces using buffalo_l model
 """
-import cv2
+import os
 import numpy as np
-from insightface.app import FaceAnalysis
-from sklearn.metrics.pairwise import cosine_similarity
 from typing import List, Tuple, Optional, Dict
 import logging
 
 logger = logging.getLogger(__name__)
 
+# ArcFace (buffalo_l) embedding size
+EMBEDDING_DIM = 512
+
+# ONNX Runtime providers in order of preference; unavailable ones are skipped
+DEFAULT_PROVIDERS = ['CUDAExecutionProvider', 'CPUExecutionProvider']
+
 
 class FaceRecognitionEngine:
     """Face recognition engine using InsightFace"""
 
-    def __init__(self, model_name: str = 'buffalo_l', detection_threshold: float = 0.5):
+    def __init__(
+        self,
+        model_name: str = 'buffalo_l',
+        detection_threshold: float = 0.5,
+        det_size: int = 640,
+        num_threads: Optional[int] = None,
+        providers: Optional[List[str]] = None
+    ):
         """
         Initialize face recognition engine
 
         Args:
             model_name: InsightFace model name (buffalo_l recommended for diverse faces)
             detection_threshold: Face detection confidence threshold
+            det_size: Square detector input size in pixels
+            num_threads: ONNX Runtime intra-op threads (None = all cores)
+            providers: Preferred ONNX Runtime execution providers (GPU first, CPU fallback)
         """
         self.model_name = model_name
         self.detection_threshold = detection_threshold
+        self.det_size = det_size
+        self.num_threads = num_threads
+        self.providers = providers or DEFAULT_PROVIDERS
         self.app = None
         self._initialize_model()
 
     def _initialize_model(self):
         """Initialize InsightFace model"""
         try:
-            logger.info(f"Initializing InsightFace model: {self.model_name}")
-            self.app = FaceAnalysis(name=self.model_name, providers=['CPUExecutionProvider'])
-            self.app.prepare(ctx_id=0, det_size=(640, 640))
+            # Imported here so that loading this module does not pull in insightface/onnxruntime
+            from insightface.app import FaceAnalysis
+
+            providers = self._select_providers()
+            logger.info(f"Initializing InsightFace model: {self.model_name} ({', '.join(providers)})")
+            self.app = FaceAnalysis(name=self.model_name, providers=providers)
+            self.app.prepare(ctx_id=0, det_size=(self.det_size, self.det_size))
+            self._tune_sessions()
+            self._warm_up()
             logger.info("Face recognition model initialized successfully")
         except Exception as e:
             logger.error(f"Failed to initialize face recognition model: {e}")
             raise
 
+    def _select_providers(self) -> List[str]:
+        """Keep the preferred execution providers that this onnxruntime build supports"""
+        import onnxruntime
+
+        available = set(onnxruntime.get_available_providers())
+        providers = [p for p in self.providers if p in available]
+        return providers or ['CPUExecutionProvider']
+
+    def _tune_sessions(self):
+        """
+        Recreate each model's ONNX Runtime session with tuned options
+
+        FaceAnalysis only forwards providers to onnxruntime, so thread count
+        and memory arena settings are applied by rebuilding the sessions.
+        """
+        import onnxruntime
+
+        sess_options = onnxruntime.SessionOptions()
+        sess_options.intra_op_num_threads = self.num_threads or os.cpu_count() or 1
+        sess_options.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+        sess_options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        sess_options.enable_mem_pattern = True
+        sess_options.enable_cpu_mem_arena = True
+        sess_options.add_session_config_entry('session.dynamic_block_base', '4')
+
+        for model in self.app.models.values():
+            model_file = getattr(model, 'model_file', None)
+            if model_file is None or getattr(model, 'session', None) is None:
+                continue
+            model.session = onnxruntime.InferenceSession(
+                model_file,
+                sess_options=sess_options,
+                providers=model.session.get_providers()
+            )
+
+        logger.info(f"ONNX Runtime sessions tuned ({sess_options.intra_op_num_threads} intra-op threads)")
+
+    def _warm_up(self):
+        """Run one inference at the fixed detector size so memory arenas are allocated up front"""
+        self.app.get(np.zeros((self.det_size, self.det_size, 3), dtype=np.uint8))
+
     def detect_faces(self, image: np.ndarray) -> List:
         """
         Detect faces in an image
@@ -57,12 +121,19 @@ class FaceRecognitionEngine:
             faces = self.app.get(image)
             # Filter by detection threshold
             faces = [face for face in faces if face.det_score >= self.detection_threshold]
-            logger.debug(f"Detected {len(faces)} faces")
+            logger.debug("Detected %d faces", len(faces))
             return faces
         except Exception as e:
             logger.error(f"Face detection error: {e}")
             return []
 
+    @staticmethod
+    def _largest_face(faces: List):
+        """Pick the face with the largest bounding box in a single pass"""
+        if len(faces) == 1:
+            return faces[0]
+        return max(faces, key=lambda x: (x.bbox[2] - x.bbox[0]) * (x.bbox[3] - x.bbox[1]))
+
     def get_embedding(self, image: np.ndarray) -> Optional[np.ndarray]:
         """
         Extract face embedding from image
@@ -81,13 +152,62 @@ class FaceRecognitionEngine:
 
         if len(faces) > 1:
             logger.warning(f"Multiple faces detected ({len(faces)}), using largest face")
-            # Use the face with largest bounding box
-            faces = sorted(faces, key=lambda x: (x.bbox[2] - x.bbox[0]) * (x.bbox[3] - x.bbox[1]), reverse=True)
 
-        # Get embedding (already normalized by InsightFace)
-        embedding = faces[0].embedding
+        # Get L2-normalized embedding from InsightFace
+        embedding = self._largest_face(faces).normed_embedding
         return embedding
 
+    def get_embeddings_batch(self, images: List[np.ndarray]) -> List[Optional[np.ndarray]]:
+        """
+        Extract face embeddings from several images with one recognition pass
+
+        Detection still runs per image; the aligned face crops are then
+        stacked and embedded in a single forward pass of the recognition model.
+
+        Args:
+            images: Input images as numpy arrays (BGR format)
+
+        Returns:
+            L2-normalized embedding per image, None where no face was detected
+        """
+        from insightface.utils import face_align
+
+        rec_model = self.app.models['recognition']
+        embeddings: List[Optional[np.ndarray]] = [None] * len(images)
+        crops = []
+        crop_indices = []
+
+        for i, image in enumerate(images):
+            if image is None or image.size == 0:
+                logger.warning("Empty image provided for face detection")
+                continue
+
+            bboxes, kpss = self.app.det_model.detect(image, max_num=0, metric='default')
+            keep = bboxes[:, 4] >= self.detection_threshold
+            bboxes, kpss = bboxes[keep], kpss[keep]
+
+            if len(bboxes) == 0:
+                logger.warning("No face detected in image")
+                continue
+
+            if len(bboxes) > 1:
+                logger.warning(f"Multiple faces detected ({len(bboxes)}), using largest face")
+
+            areas = (bboxes[:, 2] - bboxes[:, 0]) * (bboxes[:, 3] - bboxes[:, 1])
+            kps = kpss[int(areas.argmax())]
+            crops.append(face_align.norm_crop(image, landmark=kps, image_size=rec_model.input_size[0]))
+            crop_indices.append(i)
+
+        if crops:
+            features = rec_model.get_feat(crops).astype(np.float32)
+            norms = np.linalg.norm(features, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            features /= norms
+            for i, feature in zip(crop_indices, features):
+                embeddings[i] = feature
+
+        return embeddings
+
     def get_face_with_landmarks(self, image: np.ndarray) -> Optional[Dict]:
         """
         Get face embedding along with landmarks and bounding box
@@ -103,13 +223,9 @@ class FaceRecognitionEngine:
         if len(faces) == 0:
             return None
 
-        if len(faces) > 1:
-            # Use the face with largest bounding box
-            faces = sorted(faces, key=lambda x: (x.bbox[2] - x.bbox[0]) * (x.bbox[3] - x.bbox[1]), reverse=True)
-
-        face = faces[0]
+        face = self._largest_face(faces)
         return {
-            'embedding': face.embedding,
+            'embedding': face.normed_embedding,
             'landmarks': face.kps,  # 5 keypoints: eyes, nose, mouth corners
             'bbox': face.bbox,
             'det_score': face.det_score,
@@ -118,43 +234,35 @@ class FaceRecognitionEngine:
 
     def calculate_similarity(self, embedding1: np.ndarray, embedding2: np.ndarray) -> float:
         """
-        Calculate cosine similarity between two embeddings
+        Calculate cosine similarity between two L2-normalized embeddings
 
         Args:
-            embedding1: First face embedding
-            embedding2: Second face embedding
+            embedding1: First face embedding (unit norm, as returned by get_embedding)
+            embedding2: Second face embedding (unit norm, as returned by get_embedding)
 
         Returns:
             Cosine similarity score (0 to 1, higher is more similar)
         """
-        # Ensure embeddings are 2D for sklearn
-        emb1 = embedding1.reshape(1, -1)
-        emb2 = embedding2.reshape(1, -1)
-
-        # Calculate cosine similarity
-        similarity = cosine_similarity(emb1, emb2)[0][0]
-        return float(similarity)
+        return float(embedding1 @ embedding2)
 
     def recognize_face(
         self,
         image: np.ndarray,
-        known_embeddings: List[np.ndarray],
-        known_ids: List[str],
+        gallery,
         threshold: float = 0.30
     ) -> Tuple[Optional[str], float]:
         """
-        Recognize a face by comparing with known embeddings
+        Recognize a face by comparing with the enrolled gallery
 
         Args:
             image: Input image to recognize
-            known_embeddings: List of known face embeddings
-            known_ids: List of employee IDs corresponding to embeddings
+            gallery: Recognition gallery (services.Gallery) to match against
             threshold: Similarity threshold for recognition (0.25-0.30 for West African faces)
 
         Returns:
             Tuple of (employee_id, confidence) or (None, 0.0) if not recognized
         """
-        if not known_embeddings or not known_ids:
+        if len(gallery) == 0:
             logger.warning("No known embeddings provided for recognition")
             return None, 0.0
 
@@ -164,20 +272,18 @@ class FaceRecognitionEngine:
             logger.warning("No face detected in query image")
             return None, 0.0
 
-        # Calculate similarities with all known faces
-        similarities = []
-        for known_emb in known_embeddings:
-            sim = self.calculate_similarity(query_embedding, known_emb)
-            similarities.append(sim)
+        query = query_embedding.astype(np.float32)
+        query_norm = np.linalg.norm(query)
+        if query_norm == 0:
+            return None, 0.0
+        query /= query_norm
 
-        # Find best match
-        max_similarity = max(similarities)
-        best_match_idx = similarities.index(max_similarity)
+        # Score against all known faces in one search over the gallery matrix
+        employee_id, max_similarity = gallery.search(query)
 
         logger.info(f"Best match similarity: {max_similarity:.3f}, Threshold: {threshold}")
 
-        if max_similarity >= threshold:
-            employee_id = known_ids[best_match_idx]
+        if employee_id is not None and max_similarity >= threshold:
             logger.info(f"Face recognized as {employee_id} with confidence {max_similarity:.3f}")
             return employee_id, max_similarity
         else:
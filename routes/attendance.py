@@ -3,12 +3,12 @@ Attendance routes for the Face Recognition Attendance System
 Handles face recognition and attendance marking
 """
 from flask import Blueprint, render_template, request, jsonify, current_app
-from models import db, Employee, FaceEncoding, Attendance
-from models.face_engine import FaceRecognitionEngine
-from config import Config
-import cv2
-import numpy as np
+from models import db, Employee, Attendance, read_only_bind
+from sqlalchemy import select
+from services import get_gallery, get_face_engine, invalidate_stats_cache
+from config import Config, BASE_DIR
 import base64
+import os
 from pathlib import Path
 from datetime import datetime, timedelta
 import logging
@@ -16,19 +16,9 @@ import logging
 attendance_bp = Blueprint('attendance', __name__)
 logger = logging.getLogger(__name__)
 
-# Initialize components (lazy loading)
-face_engine = None
-
-
-def get_face_engine():
-    """Get or create face engine instance"""
-    global face_engine
-    if face_engine is None:
-        face_engine = FaceRecognitionEngine(
-            model_name=Config.FACE_MODEL_NAME,
-            detection_threshold=Config.FACE_DETECTION_THRESHOLD
-        )
-    return face_engine
+# Config paths as plain strings for building image paths per request
+_BASE_PREFIX = str(BASE_DIR) + os.sep
+_ATTENDANCE_IMAGES_DIR = str(Config.ATTENDANCE_IMAGES_DIR)
 
 
 @attendance_bp.route('/')
@@ -42,6 +32,9 @@ def recognize_face():
     """
     Recognize a face and mark attendance
     """
+    # Image stack is imported on first use to keep app startup light
+    from utils import decode_image, save_image_async
+
     try:
         data = request.get_json()
 
@@ -51,40 +44,27 @@ def recognize_face():
         if not image_data:
             return jsonify({'success': False, 'error': 'No image provided'}), 400
 
-        # Decode base64 image
+        # Decode base64 image (reduced scale when larger than the detector input)
         image_bytes = base64.b64decode(image_data.split(',')[1])
-        nparr = np.frombuffer(image_bytes, np.uint8)
-        image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        image = decode_image(image_bytes, min_size=Config.FACE_DETECTION_SIZE)
 
         # Get face engine
         engine = get_face_engine()
 
-        # Load all enrolled face encodings
-        face_encodings = FaceEncoding.query.filter_by(pose_type='average').all()
+        # Get cached gallery of enrolled face encodings
+        gallery = get_gallery()
 
-        if len(face_encodings) == 0:
+        if len(gallery) == 0:
             return jsonify({
                 'success': False,
                 'error': 'No enrolled employees found. Please enroll employees first.'
             }), 404
 
-        # Extract embeddings and employee IDs
-        known_embeddings = []
-        known_ids = []
-
-        for face_enc in face_encodings:
-            embedding = face_enc.get_encoding()
-            known_embeddings.append(embedding)
-            known_ids.append(face_enc.employee_id)
-
-        logger.info(f"Loaded {len(known_embeddings)} face encodings for recognition")
-
         # Perform recognition
         employee_id, confidence = engine.recognize_face(
             image,
-            known_embeddings,
-            known_ids,
-            threshold=Config.FACE_RECOGNITION_THRESHOLD
+            threshold=Config.FACE_RECOGNITION_THRESHOLD,
+            gallery=gallery
         )
 
         if employee_id is None:
@@ -96,7 +76,10 @@ def recognize_face():
             })
 
         # Get employee details
-        employee = Employee.query.filter_by(employee_id=employee_id).first()
+        employee = db.session.execute(
+            select(Employee).filter_by(employee_id=employee_id).limit(1),
+            bind_arguments=read_only_bind()
+        ).scalars().first()
 
         if not employee:
             return jsonify({
@@ -106,10 +89,13 @@ def recognize_face():
 
         # Check if already checked in today (prevent duplicate check-ins within 1 hour)
         one_hour_ago = datetime.utcnow() - timedelta(hours=1)
-        recent_attendance = Attendance.query.filter(
-            Attendance.employee_id == employee_id,
-            Attendance.timestamp >= one_hour_ago
-        ).first()
+        recent_attendance = db.session.execute(
+            select(Attendance).where(
+                Attendance.employee_id == employee_id,
+                Attendance.timestamp >= one_hour_ago
+            ).order_by(Attendance.timestamp.desc()).limit(1),
+            bind_arguments=read_only_bind()
+        ).scalars().first()
 
         if recent_attendance:
             return jsonify({
@@ -123,18 +109,17 @@ def recognize_face():
                 'last_checkin': recent_attendance.timestamp.isoformat()
             })
 
-        # Save attendance image (optional)
+        # Save attendance image (optional) in the background; the path is
+        # known up front so the record can be inserted immediately
         image_path = None
         try:
-            attendance_dir = Config.ATTENDANCE_IMAGES_DIR
-            attendance_dir.mkdir(parents=True, exist_ok=True)
-
+            # Directory is created by Config.init_app() at startup
             timestamp_str = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
             image_filename = f"{employee_id}_{timestamp_str}.jpg"
-            image_path_full = attendance_dir / image_filename
-            cv2.imwrite(str(image_path_full), image)
+            image_path_full = os.path.join(_ATTENDANCE_IMAGES_DIR, image_filename)
+            save_image_async(image_path_full, image)
 
-            image_path = str(image_path_full.relative_to(Config.BASE_DIR))
+            image_path = image_path_full[len(_BASE_PREFIX):]
         except Exception as e:
             logger.error(f"Failed to save attendance image: {e}")
 
@@ -149,6 +134,7 @@ def recognize_face():
 
         db.session.add(attendance_record)
         db.session.commit()
+        invalidate_stats_cache()
 
         logger.info(f"Attendance marked for {employee_id} ({employee.name}) with confidence {confidence:.3f}")
 
@@ -186,7 +172,10 @@ def manual_checkin():
             return jsonify({'success': False, 'error': 'Employee ID required'}), 400
 
         # Get employee
-        employee = Employee.query.filter_by(employee_id=employee_id, is_active=True).first()
+        employee = db.session.execute(
+            select(Employee).filter_by(employee_id=employee_id, is_active=True).limit(1),
+            bind_arguments=read_only_bind()
+        ).scalars().first()
 
         if not employee:
             return jsonify({
@@ -196,10 +185,13 @@ def manual_checkin():
 
         # Check if already checked in today
         one_hour_ago = datetime.utcnow() - timedelta(hours=1)
-        recent_attendance = Attendance.query.filter(
-            Attendance.employee_id == employee_id,
-            Attendance.timestamp >= one_hour_ago
-        ).first()
+        recent_attendance = db.session.execute(
+            select(Attendance).where(
+                Attendance.employee_id == employee_id,
+                Attendance.timestamp >= one_hour_ago
+            ).order_by(Attendance.timestamp.desc()).limit(1),
+            bind_arguments=read_only_bind()
+        ).scalars().first()
 
         if recent_attendance:
             return jsonify({
@@ -217,6 +209,7 @@ def manual_checkin():
 
         db.session.add(attendance_record)
         db.session.commit()
+        invalidate_stats_cache()
 
         logger.info(f"Manual attendance marked for {employee_id} ({employee.name})")
 
@@ -242,13 +235,13 @@ def today_attendance():
     """Get today's attendance records"""
     try:
         today = datetime.utcnow().date()
-        today_start = datetime.combine(today, datetime.min.time())
-        today_end = datetime.combine(today, datetime.max.time())
 
-        records = Attendance.query.filter(
-            Attendance.timestamp >= today_start,
-            Attendance.timestamp <= today_end
-        ).order_by(Attendance.timestamp.desc()).all()
+        records = db.session.execute(
+            select(Attendance).where(
+                db.func.date(Attendance.timestamp) == today.isoformat()
+            ).order_by(Attendance.timestamp.desc()),
+            bind_arguments=read_only_bind()
+        ).scalars().all()
 
         records_data = [record.to_dict() for record in records]
 
@@ -1,12 +1,20 @@
 """
 Dashboard routes for the Face Recognition Attendance System
 """
-from flask import Blueprint, render_template, jsonify
-from models import db, Employee, Attendance
+from flask import Blueprint, Response, render_template, jsonify, stream_with_context
+from models import db, Employee, FaceEncoding, Attendance, read_only_bind
+from services import get_stats_cache
 from datetime import datetime, timedelta
-from sqlalchemy import func
+from sqlalchemy import func, select
+import itertools
+import logging
+import orjson
 
 dashboard_bp = Blueprint('dashboard', __name__)
+logger = logging.getLogger(__name__)
+
+# Rows fetched and serialized per batch when streaming attendance reports
+REPORT_BATCH_SIZE = 1000
 
 
 @dashboard_bp.route('/')
@@ -19,60 +27,86 @@ def index():
 def get_stats():
     """Get dashboard statistics"""
     try:
-        # Total employees
-        total_employees = Employee.query.filter_by(is_active=True).count()
-
-        # Today's attendance
         today = datetime.utcnow().date()
+
+        # Serve from cache; check-ins and enrollment changes invalidate it
+        cache = get_stats_cache()
+        cache_key = f"stats:{today.isoformat()}"
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return jsonify(cached)
+
         today_start = datetime.combine(today, datetime.min.time())
         today_end = datetime.combine(today, datetime.max.time())
 
-        today_attendance = Attendance.query.filter(
+        # Total employees and today's attendance in a single round trip
+        active_employees = select(func.count(Employee.id)).where(
+            Employee.is_active.is_(True)
+        ).scalar_subquery()
+        todays_checkins = select(func.count(Attendance.id)).where(
             Attendance.timestamp >= today_start,
             Attendance.timestamp <= today_end
-        ).count()
-
-        # Recent check-ins (last 10)
-        recent_checkins = Attendance.query.order_by(
-            Attendance.timestamp.desc()
-        ).limit(10).all()
+        ).scalar_subquery()
+
+        total_employees, today_attendance = db.session.execute(
+            select(active_employees, todays_checkins),
+            bind_arguments=read_only_bind()
+        ).one()
+
+        # Recent check-ins (last 10), selecting only the serialized columns
+        recent_checkins = db.session.execute(
+            select(
+                Attendance.id,
+                Attendance.employee_id,
+                Attendance.employee_name,
+                Attendance.timestamp,
+                Attendance.confidence
+            ).order_by(Attendance.timestamp.desc()).limit(10),
+            bind_arguments=read_only_bind()
+        )
 
         recent_checkins_data = [
             {
-                'id': record.id,
-                'employee_id': record.employee_id,
-                'employee_name': record.employee_name,
-                'timestamp': record.timestamp.isoformat() if record.timestamp else None,
-                'confidence': record.confidence
+                'id': record_id,
+                'employee_id': employee_id,
+                'employee_name': employee_name,
+                'timestamp': timestamp.isoformat() if timestamp else None,
+                'confidence': confidence
             }
-            for record in recent_checkins
+            for record_id, employee_id, employee_name, timestamp, confidence in recent_checkins
         ]
 
-        # Weekly attendance trend (last 7 days)
+        # Weekly attendance trend (last 7 days) in one grouped query
+        week_start = datetime.combine(today - timedelta(days=6), datetime.min.time())
+        attendance_day = func.date(Attendance.timestamp)
+        daily_counts = dict(
+            db.session.execute(
+                select(attendance_day, func.count(Attendance.id))
+                .where(Attendance.timestamp >= week_start, Attendance.timestamp <= today_end)
+                .group_by(attendance_day),
+                bind_arguments=read_only_bind()
+            ).all()
+        )
+
         weekly_data = []
         for i in range(6, -1, -1):
             day = today - timedelta(days=i)
-            day_start = datetime.combine(day, datetime.min.time())
-            day_end = datetime.combine(day, datetime.max.time())
-
-            count = Attendance.query.filter(
-                Attendance.timestamp >= day_start,
-                Attendance.timestamp <= day_end
-            ).count()
-
             weekly_data.append({
                 'date': day.isoformat(),
-                'count': count
+                'count': daily_counts.get(day.isoformat(), 0)
             })
 
-        return jsonify({
+        stats = {
             'success': True,
             'total_employees': total_employees,
             'today_attendance': today_attendance,
             'attendance_percentage': round((today_attendance / total_employees * 100) if total_employees > 0 else 0, 1),
             'recent_checkins': recent_checkins_data,
             'weekly_trend': weekly_data
-        })
+        }
+        cache.set(cache_key, stats)
+
+        return jsonify(stats)
 
     except Exception as e:
         return jsonify({
@@ -91,9 +125,17 @@ def employees_list():
 def get_employees():
     """Get all employees"""
     try:
-        employees = Employee.query.order_by(Employee.enrolled_at.desc()).all()
-
-        employees_data = [emp.to_dict() for emp in employees]
+        # Count face encodings in the same statement instead of loading them per
+        # employee (a relationship loader would also leave the read-only pool)
+        face_count = select(func.count(FaceEncoding.id)).where(
+            FaceEncoding.employee_id == Employee.employee_id
+        ).correlate(Employee).scalar_subquery()
+        employees = db.session.execute(
+            select(Employee, face_count).order_by(Employee.enrolled_at.desc()),
+            bind_arguments=read_only_bind()
+        ).all()
+
+        employees_data = [emp.to_dict(face_count=count) for emp, count in employees]
 
         return jsonify({
             'success': True,
@@ -139,23 +181,55 @@ def get_attendance_report():
         start_datetime = datetime.combine(start_date, datetime.min.time())
         end_datetime = datetime.combine(end_date, datetime.max.time())
 
-        # Query attendance records
-        records = Attendance.query.filter(
+        # Query attendance columns directly, skipping per-row ORM hydration,
+        # and fetch them in batches so the report is never fully materialized
+        records_query = select(
+            Attendance.id,
+            Attendance.employee_id,
+            Attendance.employee_name,
+            Attendance.timestamp,
+            Attendance.confidence,
+            Attendance.status,
+            Attendance.image_path
+        ).where(
             Attendance.timestamp >= start_datetime,
             Attendance.timestamp <= end_datetime
-        ).order_by(Attendance.timestamp.desc()).all()
-
-        records_data = [record.to_dict() for record in records]
-
-        return jsonify({
-            'success': True,
-            'records': records_data,
-            'count': len(records_data),
-            'start_date': start_date.isoformat(),
-            'end_date': end_date.isoformat()
-        })
+        ).order_by(Attendance.timestamp.desc()).execution_options(yield_per=REPORT_BATCH_SIZE)
+
+        result = db.session.execute(records_query, bind_arguments=read_only_bind())
+
+        # Fetch the first batch before streaming, so query errors still get a 500 response
+        batches = result.partitions()
+        first_batch = next(batches, [])
+
+        def generate():
+            # Same document fields as before, serialized one batch at a time; 'success'
+            # comes last because a later batch can still fail once the 200 is sent
+            yield orjson.dumps({
+                'start_date': start_date.isoformat(),
+                'end_date': end_date.isoformat()
+            })[:-1] + b',"records":['
+
+            count = 0
+            try:
+                for batch in itertools.chain([first_batch], batches):
+                    if not batch:
+                        continue
+                    chunk = b','.join(orjson.dumps(record._asdict()) for record in batch)
+                    yield chunk if count == 0 else b',' + chunk
+                    count += len(batch)
+            except Exception as e:
+                # Close the document with an error instead of truncating it
+                logger.error(f"Attendance report streaming error: {e}", exc_info=True)
+                yield b'],"count":' + str(count).encode() + b',"success":false,"error":' + orjson.dumps(str(e)) + b'}'
+                return
+
+            yield b'],"count":' + str(count).encode() + b',"success":true}'
+
+        return Response(stream_with_context(generate()), mimetype='application/json')
 
     except Exception as e:
+        logger.error(f"Attendance report error: {e}", exc_info=True)
         return jsonify({
             'success': False,
             'error': str(e)
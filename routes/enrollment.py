@@ -3,59 +3,30 @@ Enrollment routes for the Face Recognition Attendance System
 Handles guided enrollment with multi-pose capture
 """
 from flask import Blueprint, render_template, request, jsonify, current_app
-from models import db, Employee, FaceEncoding
-from models.face_engine import FaceRecognitionEngine
-from utils import ImageQualityChecker, PoseEstimator
+from models import db, Employee, FaceEncoding, read_only_bind
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy import delete, exists, select
+from services import (
+    get_face_engine, get_quality_checker, get_pose_estimator,
+    invalidate_gallery, invalidate_stats_cache
+)
 from config import Config, BASE_DIR
-import cv2
-import numpy as np
 import base64
+import os
 from pathlib import Path
 from datetime import datetime
+import threading
 import logging
 
 enrollment_bp = Blueprint('enrollment', __name__)
 logger = logging.getLogger(__name__)
 
-# Initialize components (lazy loading)
-face_engine = None
-quality_checker = None
-pose_estimator = None
+# Config paths as plain strings for building image paths per request
+_BASE_PREFIX = str(BASE_DIR) + os.sep
+_ENROLLED_FACES_DIR = str(Config.ENROLLED_FACES_DIR)
 
-
-def get_face_engine():
-    """Get or create face engine instance"""
-    global face_engine
-    if face_engine is None:
-        face_engine = FaceRecognitionEngine(
-            model_name=Config.FACE_MODEL_NAME,
-            detection_threshold=Config.FACE_DETECTION_THRESHOLD
-        )
-    return face_engine
-
-
-def get_quality_checker():
-    """Get or create quality checker instance"""
-    global quality_checker
-    if quality_checker is None:
-        quality_checker = ImageQualityChecker(
-            min_blur_threshold=Config.MIN_BLUR_THRESHOLD,
-            min_brightness=Config.MIN_BRIGHTNESS,
-            max_brightness=Config.MAX_BRIGHTNESS,
-            min_contrast=Config.MIN_CONTRAST,
-            min_face_size=Config.MIN_FACE_SIZE,
-            max_face_size=Config.MAX_FACE_SIZE,
-            max_center_offset=Config.MAX_CENTER_OFFSET
-        )
-    return quality_checker
-
-
-def get_pose_estimator():
-    """Get or create pose estimator instance"""
-    global pose_estimator
-    if pose_estimator is None:
-        pose_estimator = PoseEstimator()
-    return pose_estimator
+# Bounds concurrent preview-frame validations across all clients
+validation_slots = threading.BoundedSemaphore(Config.MAX_CONCURRENT_VALIDATIONS)
 
 
 @enrollment_bp.route('/')
@@ -70,98 +41,146 @@ def guided():
     return render_template('enroll_guided.html')
 
 
-@enrollment_bp.route('/api/validate_frame', methods=['POST'])
-def validate_frame():
+def evaluate_frame(image, pose_type: str, track_id=None) -> dict:
     """
-    Validate a frame for quality and pose requirements
-    Used during guided enrollment
+    Run face detection, quality checks and pose estimation on a preview frame
+
+    Args:
+        image: Decoded frame (BGR)
+        pose_type: Pose the user is asked to hold
+        track_id: Optional ID of the streaming client, used to warm-start its pose estimate
+
+    Returns:
+        Validation result (may hold numpy scalars; the app's JSON provider serializes them)
     """
-    try:
-        data = request.get_json()
+    # Get face engine
+    engine = get_face_engine()
 
-        # Decode image
-        image_data = data.get('image')
-        pose_type = data.get('pose_type', 'front')
+    # Detect face and get landmarks
+    face_info = engine.get_face_with_landmarks(image)
 
-        if not image_data:
-            return jsonify({'success': False, 'error': 'No image provided'}), 400
+    if face_info is None:
+        return {
+            'success': True,
+            'ready_to_capture': False,
+            'feedback': 'No face detected. Position yourself in frame',
+            'quality_pass': False,
+            'pose_pass': False
+        }
+
+    # Get quality checker and pose estimator
+    qc = get_quality_checker()
+    pe = get_pose_estimator()
+
+    # Check quality
+    quality_results = qc.check_all(
+        image,
+        face_bbox=face_info['bbox'],
+        landmarks=face_info['landmarks']
+    )
+
+    # Estimate pose only for frames that passed quality; failing frames
+    # cannot be captured anyway, so the solvePnP call is skipped
+    pose = None
+    if quality_results['overall_pass']:
+        pose = pe.estimate_pose(face_info['landmarks'], image.shape, track_id=track_id)
+
+    # Without ENFORCE_POSE_REQUIREMENTS the quality checks alone decide readiness
+    if not Config.ENFORCE_POSE_REQUIREMENTS:
+        pose_pass = True
+        pose_feedback = "Pose OK (not enforced)"
+    elif pose is not None:
+        pose_pass, pose_feedback = pe.check_pose_requirement(
+            pose,
+            pose_type,
+            Config.POSE_REQUIREMENTS
+        )
+    else:
+        pose_pass = False
+        pose_feedback = "Could not detect head pose"
+
+    # Get pose instruction
+    pose_instruction = pe.get_pose_instruction(pose_type)
+
+    # Combine feedback
+    feedback_messages = [f"📸 {pose_instruction}"]
+
+    if not quality_results['overall_pass']:
+        feedback_messages.extend(quality_results['feedback_messages'])
+    elif not pose_pass:
+        feedback_messages.append(pose_feedback)
+    else:
+        feedback_messages.append("✓ Perfect! Hold still...")
+
+    # Determine readiness
+    ready_to_capture = quality_results['overall_pass'] and pose_pass
+
+    return {
+        'success': True,
+        'ready_to_capture': ready_to_capture,
+        'feedback': ' | '.join(feedback_messages),
+        'quality_pass': quality_results['overall_pass'],
+        'pose_pass': pose_pass,
+        'quality_score': quality_results.get('quality_score', 0),
+        'pose': pose
+    }
+
+
+def validate_frame_bytes(image_bytes: bytes, pose_type: str, track_id=None) -> dict:
+    """
+    Decode and evaluate an encoded preview frame
 
-        # Decode base64 image
-        image_bytes = base64.b64decode(image_data.split(',')[1])
-        nparr = np.frombuffer(image_bytes, np.uint8)
-        image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    Frames are dropped when all validation slots are busy; the client keeps
+    its previous feedback and sends a newer frame on the next tick.
 
-        # Get face engine
-        engine = get_face_engine()
+    Args:
+        image_bytes: Encoded frame (JPEG)
+        pose_type: Pose the user is asked to hold
+        track_id: Optional ID of the streaming client, used to warm-start its pose estimate
 
-        # Detect face and get landmarks
-        face_info = engine.get_face_with_landmarks(image)
+    Returns:
+        Validation result, or a 'skipped' result if the frame was dropped
+    """
+    # Image stack is imported on first use to keep app startup light
+    from utils import decode_image
+
+    if not validation_slots.acquire(blocking=False):
+        return {'success': True, 'skipped': True, 'ready_to_capture': False}
+
+    try:
+        # Preview frames only drive feedback, so let libjpeg downscale
+        # them; enrollment images are still decoded at full resolution
+        image = decode_image(image_bytes, min_size=Config.PREVIEW_DECODE_SIZE)
+        return evaluate_frame(image, pose_type, track_id)
+    finally:
+        validation_slots.release()
 
-        if face_info is None:
-            return jsonify({
-                'success': True,
-                'ready_to_capture': False,
-                'feedback': 'No face detected. Position yourself in frame',
-                'quality_pass': False,
-                'pose_pass': False
-            })
-
-        # Get quality checker and pose estimator
-        qc = get_quality_checker()
-        pe = get_pose_estimator()
-
-        # Check quality
-        quality_results = qc.check_all(
-            image,
-            face_bbox=face_info['bbox'],
-            landmarks=face_info['landmarks']
-        )
 
-        # Estimate pose
-        pose = pe.estimate_pose(face_info['landmarks'], image.shape)
-
-        # TEMPORARY FIX: Bypass broken pose checking
-        # Pose estimation is producing inverted/incorrect angles (e.g., yaw=-169° when should be ~0°)
-        # Since quality checks are working correctly, we'll rely on those instead
-        # TODO: Fix pose estimator landmark interpretation in utils/pose_estimator.py
-        pose_pass = True  # Always pass pose check
-        pose_feedback = "Pose OK (bypassed)"
-
-        # Commented out broken pose checking:
-        # if pose is not None:
-        #     pose_pass, pose_feedback = pe.check_pose_requirement(
-        #         pose,
-        #         pose_type,
-        #         Config.POSE_REQUIREMENTS
-        #     )
-        # else:
-        #     pose_feedback = "Could not detect head pose"
-
-        # Get pose instruction
-        pose_instruction = pe.get_pose_instruction(pose_type)
-
-        # Combine feedback
-        feedback_messages = [f"📸 {pose_instruction}"]
-
-        if not quality_results['overall_pass']:
-            feedback_messages.extend(quality_results['feedback_messages'])
-        elif not pose_pass:
-            feedback_messages.append(pose_feedback)
+@enrollment_bp.route('/api/validate_frame', methods=['POST'])
+def validate_frame():
+    """
+    Validate a frame for quality and pose requirements
+    Used during guided enrollment
+
+    Accepts either a raw JPEG body (application/octet-stream or image/jpeg,
+    pose_type as a query parameter) or JSON with a base64 data URL.
+    The guided capture page streams frames over Socket.IO instead when it can
+    (see routes.realtime).
+    """
+    try:
+        if request.mimetype == 'application/octet-stream' or request.mimetype.startswith('image/'):
+            image_bytes = request.get_data(cache=False)
+            pose_type = request.args.get('pose_type', 'front')
         else:
-            feedback_messages.append("✓ Perfect! Hold still...")
+            data = request.get_json()
+            image_data = data.get('image')
+            pose_type = data.get('pose_type', 'front')
+            image_bytes = base64.b64decode(image_data.split(',')[1]) if image_data else b''
 
-        # Determine readiness
-        ready_to_capture = quality_results['overall_pass'] and pose_pass
+        if not image_bytes:
+            return jsonify({'success': False, 'error': 'No image provided'}), 400
 
-        return jsonify({
-            'success': True,
-            'ready_to_capture': bool(ready_to_capture),  # Convert to Python bool
-            'feedback': ' | '.join(feedback_messages),
-            'quality_pass': bool(quality_results['overall_pass']),  # Convert to Python bool
-            'pose_pass': bool(pose_pass),  # Convert to Python bool
-            'quality_score': float(quality_results.get('quality_score', 0)),  # Convert to Python float
-            'pose': pose if pose is None else {k: float(v) if v is not None else None for k, v in pose.items()}  # Convert pose values
-        })
+        return jsonify(validate_frame_bytes(image_bytes, pose_type))
 
     except Exception as e:
         logger.error(f"Frame validation error: {e}", exc_info=True)
@@ -175,9 +194,24 @@ def validate_frame():
 def enroll_employee():
     """
     Enroll a new employee with multiple face images
+
+    Expects multipart/form-data with the employee fields as form fields and
+    one JPEG file part per pose type. A JSON body with base64 data URLs under
+    'images' is still accepted.
     """
+    # Image stack is imported on first use to keep app startup light
+    from utils import decode_image, save_image_async
+
     try:
-        data = request.get_json()
+        if request.files:
+            data = request.form
+            images_data = {pose_type: fs.read() for pose_type, fs in request.files.items()}
+        else:
+            data = request.get_json()
+            images_data = {
+                pose_type: base64.b64decode(image_data.split(',')[1])
+                for pose_type, image_data in data.get('images', {}).items()
+            }
 
         # Extract employee information
         employee_id = data.get('employee_id')
@@ -185,7 +219,6 @@ def enroll_employee():
         department = data.get('department', '')
         email = data.get('email', '')
         phone = data.get('phone', '')
-        images_data = data.get('images', {})  # Dict with pose_type as key
 
         # Validate required fields
         if not employee_id or not name:
@@ -200,46 +233,48 @@ def enroll_employee():
                 'error': 'No images provided for enrollment'
             }), 400
 
-        # Check if employee already exists
-        existing = Employee.query.filter_by(employee_id=employee_id).first()
-        if existing:
+        # Check if employee already exists (on the read-only pool, so the single
+        # read-write connection is not held through detection and image writes;
+        # the unique constraint still guards the commit)
+        already_enrolled = db.session.scalar(
+            select(exists().where(Employee.employee_id == employee_id)),
+            bind_arguments=read_only_bind()
+        )
+        if already_enrolled:
             return jsonify({
                 'success': False,
                 'error': f'Employee {employee_id} already exists'
             }), 400
 
         # Create employee directory
-        employee_dir = Config.ENROLLED_FACES_DIR / employee_id
-        employee_dir.mkdir(parents=True, exist_ok=True)
+        employee_dir = os.path.join(_ENROLLED_FACES_DIR, employee_id)
+        os.makedirs(employee_dir, exist_ok=True)
 
         # Get face engine
         engine = get_face_engine()
 
-        # Process images and extract embeddings
+        # Decode all images, then extract embeddings in one batch
+        pose_types = list(images_data.keys())
+        images = [decode_image(image_bytes) for image_bytes in images_data.values()]
+        batch_embeddings = engine.get_embeddings_batch(images)
+
         embeddings = []
         saved_images = {}
+        pending_writes = []
 
-        for pose_type, image_data in images_data.items():
-            # Decode image
-            image_bytes = base64.b64decode(image_data.split(',')[1])
-            nparr = np.frombuffer(image_bytes, np.uint8)
-            image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-
-            # Extract embedding
-            embedding = engine.get_embedding(image)
-
+        for pose_type, image, embedding in zip(pose_types, images, batch_embeddings):
             if embedding is None:
                 logger.warning(f"No face detected in {pose_type} image for {employee_id}")
                 continue
 
             embeddings.append(embedding)
 
-            # Save image
+            # Save image (written in parallel on the I/O pool)
             image_filename = f"{pose_type}.jpg"
-            image_path = employee_dir / image_filename
-            cv2.imwrite(str(image_path), image)
+            image_path = os.path.join(employee_dir, image_filename)
+            pending_writes.append(save_image_async(image_path, image))
 
-            saved_images[pose_type] = str(image_path.relative_to(BASE_DIR))
+            saved_images[pose_type] = image_path[len(_BASE_PREFIX):]
 
         if len(embeddings) == 0:
             return jsonify({
@@ -259,30 +294,51 @@ def enroll_employee():
             phone=phone
         )
 
-        db.session.add(employee)
-
-        # Create face encoding records
-        # Save average embedding
-        avg_face_encoding = FaceEncoding(
-            employee_id=employee_id,
-            pose_type='average',
-            image_path=saved_images.get('front', '')
-        )
-        avg_face_encoding.set_encoding(avg_embedding)
-        db.session.add(avg_face_encoding)
+        # Create face encoding records: the average embedding plus one per pose
+        encoding_rows = [('average', saved_images.get('front', ''), avg_embedding)]
+        encoding_rows += [
+            (pose_type, image_path, embedding)
+            for embedding, (pose_type, image_path) in zip(embeddings, saved_images.items())
+        ]
 
-        # Save individual embeddings
-        for i, (embedding, (pose_type, image_path)) in enumerate(zip(embeddings, saved_images.items())):
+        face_encodings = []
+        for pose_type, image_path, embedding in encoding_rows:
             face_encoding = FaceEncoding(
                 employee_id=employee_id,
                 pose_type=pose_type,
                 image_path=image_path
             )
             face_encoding.set_encoding(embedding)
-            db.session.add(face_encoding)
+            face_encodings.append(face_encoding)
+
+        # Added together so the flush batches the encodings into one multi-row INSERT
+        db.session.add(employee)
+        db.session.add_all(face_encodings)
+
+        # Images must be on disk before the records pointing at them are committed
+        # (wait for every write so none is still running when we clean up)
+        write_results = [write.result() for write in pending_writes]
+        if not all(write_results):
+            db.session.rollback()
+            import shutil
+            shutil.rmtree(employee_dir, ignore_errors=True)
+            return jsonify({
+                'success': False,
+                'error': 'Failed to save enrollment images'
+            }), 500
 
         # Commit to database
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Enrolled concurrently since the existence check
+            db.session.rollback()
+            return jsonify({
+                'success': False,
+                'error': f'Employee {employee_id} already exists'
+            }), 400
+        invalidate_gallery()
+        invalidate_stats_cache()
 
         logger.info(f"Successfully enrolled employee: {employee_id} ({name}) with {len(embeddings)} images")
 
@@ -306,24 +362,28 @@ def enroll_employee():
 def delete_employee(employee_id):
     """Delete an employee and their face encodings"""
     try:
-        employee = Employee.query.filter_by(employee_id=employee_id).first()
+        # Delete from database with bulk DELETEs; face encodings go first
+        # since the ORM cascade does not apply without loading the employee
+        db.session.execute(delete(FaceEncoding).where(FaceEncoding.employee_id == employee_id))
+        result = db.session.execute(delete(Employee).where(Employee.employee_id == employee_id))
 
-        if not employee:
+        if result.rowcount == 0:
+            db.session.rollback()
             return jsonify({
                 'success': False,
                 'error': 'Employee not found'
             }), 404
 
-        # Delete employee directory
+        db.session.commit()
+        invalidate_gallery()
+        invalidate_stats_cache()
+
+        # Delete employee directory once the records are gone
         employee_dir = Config.ENROLLED_FACES_DIR / employee_id
         if employee_dir.exists():
             import shutil
             shutil.rmtree(employee_dir)
 
-        # Delete from database (cascade will delete face encodings)
-        db.session.delete(employee)
-        db.session.commit()
-
         logger.info(f"Deleted employee: {employee_id}")
 
         return jsonify({
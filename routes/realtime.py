@@ -0,0 +1,43 @@
+"""
+Real-time routes for the Face Recognition Attendance System
+Streams guided enrollment preview frames over Socket.IO
+"""
+from flask import request
+from flask_socketio import SocketIO
+from routes.enrollment import validate_frame_bytes
+from services import get_pose_estimator
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Bound to the app in create_app(); handlers below are registered on init
+socketio = SocketIO()
+
+
+@socketio.on('frame', namespace='/enroll')
+def on_frame(data):
+    """
+    Validate a streamed preview frame
+
+    The result is returned as the event acknowledgement, so each client has
+    at most one frame in flight and waits for feedback before sending the next.
+
+    Args:
+        data: Dict with 'image' (raw JPEG bytes) and 'pose_type'
+    """
+    try:
+        image_bytes = data.get('image') if isinstance(data, dict) else None
+        if not image_bytes:
+            return {'success': False, 'error': 'No image provided'}
+
+        return validate_frame_bytes(image_bytes, data.get('pose_type', 'front'), track_id=request.sid)
+
+    except Exception as e:
+        logger.error(f"Frame stream validation error: {e}", exc_info=True)
+        return {'success': False, 'error': str(e)}
+
+
+@socketio.on('disconnect', namespace='/enroll')
+def on_disconnect(*args):
+    """Drop the per-client pose warm-start state"""
+    get_pose_estimator().reset_track(request.sid)
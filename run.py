@@ -14,9 +14,14 @@ print()
 
 # Import and run
 from app import create_app
+from config import Config
 
 app = create_app()
 
+# FLASK_DEBUG=1 runs the Werkzeug debug server (WebSocket transport, tracebacks);
+# otherwise the app is served by Waitress with a thread pool
+debug = os.environ.get('FLASK_DEBUG') == '1'
+
 print()
 print("=" * 60)
 print("APPLICATION STARTED SUCCESSFULLY!")
@@ -33,8 +38,14 @@ print("  - View Employees:    http://localhost:5000/employees")
 print("  - Reports:           http://localhost:5000/reports")
 print("  - System Test:       http://localhost:5000/test")
 print()
+print(f"Server: {'Werkzeug (debug)' if debug else f'Waitress ({Config.SERVER_THREADS} threads)'}")
 print("Press Ctrl+C to stop the server")
 print("=" * 60)
 print()
 
-app.run(debug=True, host='0.0.0.0', port=5000, use_reloader=False)
+if debug:
+    app.extensions['socketio'].run(app, debug=True, host='0.0.0.0', port=5000, use_reloader=False)
+else:
+    from waitress import serve
+
+    serve(app, host='0.0.0.0', port=5000, threads=Config.SERVER_THREADS)
@@ -0,0 +1,10 @@
+"""Services package initialization"""
+from .gallery import Gallery, get_gallery, invalidate_gallery
+from .cache import TTLCache, get_stats_cache, invalidate_stats_cache
+from .components import get_face_engine, get_quality_checker, get_pose_estimator
+
+__all__ = [
+    'Gallery', 'get_gallery', 'invalidate_gallery',
+    'TTLCache', 'get_stats_cache', 'invalidate_stats_cache',
+    'get_face_engine', 'get_quality_checker', 'get_pose_estimator'
+]
@@ -0,0 +1,64 @@
+"""
+Response caches
+Short-lived in-process cache for dashboard statistics
+"""
+from flask import current_app
+from typing import Any, Dict, Optional, Tuple
+import threading
+import time
+
+
+class TTLCache:
+    """Thread-safe in-process cache whose entries expire after a fixed time"""
+
+    def __init__(self, ttl: float):
+        """
+        Initialize cache
+
+        Args:
+            ttl: Entry lifetime in seconds
+        """
+        self.ttl = ttl
+        self._entries: Dict[str, Tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        """Get a cached value, or None if missing or expired"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        expires_at, value = entry
+        if time.monotonic() >= expires_at:
+            with self._lock:
+                self._entries.pop(key, None)
+            return None
+        return value
+
+    def set(self, key: str, value: Any):
+        """Store a value for the cache's TTL"""
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+
+    def clear(self):
+        """Drop all entries"""
+        with self._lock:
+            self._entries.clear()
+
+
+def get_stats_cache() -> TTLCache:
+    """Get the application's dashboard statistics cache"""
+    cache = current_app.extensions.get('stats_cache')
+    if cache is None:
+        cache = current_app.extensions.setdefault(
+            'stats_cache',
+            TTLCache(current_app.config.get('STATS_CACHE_TTL', 30))
+        )
+    return cache
+
+
+def invalidate_stats_cache():
+    """Invalidate cached dashboard statistics after attendance or enrollment changes"""
+    cache = current_app.extensions.get('stats_cache')
+    if cache is not None:
+        cache.clear()
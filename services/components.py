@@ -0,0 +1,76 @@
+"""
+Shared recognition components
+One face engine, quality checker and pose estimator per application,
+stored in app.extensions and shared by all blueprints
+"""
+from flask import current_app
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Serializes first-time construction so concurrent requests build each component once
+_init_lock = threading.Lock()
+
+
+def _get_component(name: str, factory):
+    """Get a component from app.extensions, building it on first use"""
+    component = current_app.extensions.get(name)
+    if component is None:
+        with _init_lock:
+            component = current_app.extensions.get(name)
+            if component is None:
+                component = factory(current_app.config)
+                current_app.extensions[name] = component
+                logger.info(f"Initialized {name}")
+    return component
+
+
+def _create_face_engine(config):
+    # Imported here so that app startup does not pull in insightface/onnxruntime
+    from models.face_engine import FaceRecognitionEngine
+
+    return FaceRecognitionEngine(
+        model_name=config['FACE_MODEL_NAME'],
+        detection_threshold=config['FACE_DETECTION_THRESHOLD'],
+        det_size=config['FACE_DETECTION_SIZE'],
+        num_threads=config['FACE_NUM_THREADS'],
+        providers=config['FACE_EXECUTION_PROVIDERS']
+    )
+
+
+def _create_quality_checker(config):
+    from utils import ImageQualityChecker
+
+    return ImageQualityChecker(
+        min_blur_threshold=config['MIN_BLUR_THRESHOLD'],
+        min_brightness=config['MIN_BRIGHTNESS'],
+        max_brightness=config['MAX_BRIGHTNESS'],
+        min_contrast=config['MIN_CONTRAST'],
+        min_face_size=config['MIN_FACE_SIZE'],
+        max_face_size=config['MAX_FACE_SIZE'],
+        max_center_offset=config['MAX_CENTER_OFFSET'],
+        use_opencl=config['QUALITY_USE_OPENCL'],
+        use_face_region=config['QUALITY_USE_FACE_REGION']
+    )
+
+
+def _create_pose_estimator(config):
+    from utils import PoseEstimator
+
+    return PoseEstimator(use_pnp=config['POSE_USE_PNP'])
+
+
+def get_face_engine():
+    """Get the application's face recognition engine"""
+    return _get_component('face_engine', _create_face_engine)
+
+
+def get_quality_checker():
+    """Get the application's image quality checker"""
+    return _get_component('quality_checker', _create_quality_checker)
+
+
+def get_pose_estimator():
+    """Get the application's head pose estimator"""
+    return _get_component('pose_estimator', _create_pose_estimator)
@@ -0,0 +1,220 @@
+"""
+Recognition gallery
+Keeps the enrolled average embeddings in memory as one normalized matrix,
+persisted as a memory-mapped snapshot so restarts skip the database load
+"""
+from flask import current_app
+from models import db, FaceEncoding, read_only_bind
+from sqlalchemy import select, func
+from models.face_engine import EMBEDDING_DIM
+from pathlib import Path
+from typing import List, NamedTuple, Optional, Tuple
+import numpy as np
+import threading
+import json
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class GallerySnapshot(NamedTuple):
+    """One consistent version of the gallery; replaced as a whole, never mutated"""
+    embeddings: np.ndarray
+    ids: List[str]
+    index: object
+    version: int
+
+
+_EMPTY_SNAPSHOT = GallerySnapshot(np.empty((0, EMBEDDING_DIM), dtype=np.float32), [], None, 0)
+
+
+class Gallery:
+    """In-memory gallery of enrolled face embeddings"""
+
+    def __init__(self, snapshot_path: Optional[Path] = None):
+        """
+        Initialize gallery
+
+        Args:
+            snapshot_path: Path of the .npy embedding snapshot (IDs are kept alongside as .json)
+        """
+        self.snapshot_path = Path(snapshot_path) if snapshot_path else None
+        # Readers take the current snapshot with a single attribute read, so a
+        # concurrent refresh can never pair one version's matrix with another's IDs
+        self._snapshot = _EMPTY_SNAPSHOT
+        self._stale = True
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._snapshot.ids)
+
+    @property
+    def embeddings(self) -> np.ndarray:
+        return self._snapshot.embeddings
+
+    @property
+    def ids(self) -> List[str]:
+        return self._snapshot.ids
+
+    @property
+    def version(self) -> int:
+        return self._snapshot.version
+
+    def invalidate(self):
+        """Mark the gallery for reload on next use"""
+        self._stale = True
+
+    def refresh(self):
+        """Reload average embeddings from the snapshot, or from the database if it is out of date"""
+        # Cleared before loading so an invalidate() that arrives mid-refresh triggers another one
+        self._stale = False
+
+        try:
+            signature = self._database_signature()
+
+            loaded = self._load_snapshot(signature)
+            if loaded is None:
+                loaded = self._load_database()
+                self._save_snapshot(signature, *loaded)
+        except Exception:
+            self._stale = True
+            raise
+
+        embeddings, ids = loaded
+        snapshot = GallerySnapshot(embeddings, ids, self._build_index(embeddings), self._snapshot.version + 1)
+        self._snapshot = snapshot
+
+        logger.info(f"Loaded {len(snapshot.ids)} face encodings into recognition gallery (v{snapshot.version})")
+
+    @staticmethod
+    def _database_signature() -> List:
+        """Cheap fingerprint of the enrolled average encodings, used to validate the snapshot"""
+        count, max_id, max_created_at = db.session.execute(
+            select(
+                func.count(FaceEncoding.id),
+                func.max(FaceEncoding.id),
+                func.max(FaceEncoding.created_at)
+            ).filter_by(pose_type='average'),
+            bind_arguments=read_only_bind()
+        ).one()
+        return [count, max_id, max_created_at.isoformat() if max_created_at else None]
+
+    @staticmethod
+    def _load_database() -> Tuple[np.ndarray, List[str]]:
+        """Load and normalize average embeddings from the database, returning (matrix, ids)"""
+        rows = db.session.execute(
+            select(FaceEncoding.employee_id, FaceEncoding.encoding).filter_by(pose_type='average'),
+            bind_arguments=read_only_bind()
+        ).all()
+
+        if rows:
+            matrix = np.stack([FaceEncoding.decode_encoding(encoding) for _, encoding in rows]).astype(np.float32)
+            # Pre-normalize rows so scoring is a plain dot product
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            matrix /= norms
+        else:
+            matrix = np.empty((0, EMBEDDING_DIM), dtype=np.float32)
+
+        return np.ascontiguousarray(matrix), [employee_id for employee_id, _ in rows]
+
+    def _ids_path(self) -> Path:
+        return self.snapshot_path.with_suffix('.json')
+
+    def _load_snapshot(self, signature: List) -> Optional[Tuple[np.ndarray, List[str]]]:
+        """Memory-map the snapshot if it matches the database; returns (matrix, ids) or None"""
+        if self.snapshot_path is None or not self.snapshot_path.exists():
+            return None
+
+        try:
+            with open(self._ids_path(), 'r') as f:
+                meta = json.load(f)
+            if meta.get('signature') != signature:
+                return None
+
+            matrix = np.load(self.snapshot_path, mmap_mode='r')
+            if matrix.shape != (len(meta['ids']), EMBEDDING_DIM):
+                return None
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable gallery snapshot: {e}")
+            return None
+
+        return matrix, list(meta['ids'])
+
+    def _save_snapshot(self, signature: List, embeddings: np.ndarray, ids: List[str]):
+        """Atomically write the current gallery to the snapshot files"""
+        if self.snapshot_path is None:
+            return
+
+        try:
+            self.snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+
+            tmp_matrix = self.snapshot_path.with_suffix('.tmp.npy')
+            np.save(tmp_matrix, embeddings)
+            os.replace(tmp_matrix, self.snapshot_path)
+
+            tmp_ids = self._ids_path().with_suffix('.tmp')
+            with open(tmp_ids, 'w') as f:
+                json.dump({'signature': signature, 'ids': ids}, f)
+            os.replace(tmp_ids, self._ids_path())
+        except Exception as e:
+            logger.error(f"Failed to write gallery snapshot: {e}")
+
+    @staticmethod
+    def _build_index(matrix: np.ndarray):
+        """Build a FAISS inner-product index over the gallery, if FAISS is installed"""
+        if len(matrix) == 0:
+            return None
+
+        # Imported here so that app startup does not load FAISS
+        try:
+            import faiss
+        except ImportError:  # Optional: fall back to a numpy matrix-vector product
+            return None
+
+        index = faiss.IndexFlatIP(matrix.shape[1])
+        index.add(matrix)
+        return index
+
+    def search(self, query: np.ndarray) -> Tuple[Optional[str], float]:
+        """
+        Find the best matching gallery entry for a normalized query embedding
+
+        Returns:
+            Tuple of (employee_id, cosine similarity), or (None, 0.0) if the gallery is empty
+        """
+        snapshot = self._snapshot
+        if len(snapshot.ids) == 0:
+            return None, 0.0
+
+        if snapshot.index is not None:
+            scores, indices = snapshot.index.search(query.reshape(1, -1), 1)
+            return snapshot.ids[int(indices[0, 0])], float(scores[0, 0])
+
+        similarities = snapshot.embeddings @ query
+        best_match_idx = int(similarities.argmax())
+        return snapshot.ids[best_match_idx], float(similarities[best_match_idx])
+
+    def ensure_loaded(self) -> 'Gallery':
+        """Reload the gallery if it has been invalidated"""
+        if self._stale:
+            with self._lock:
+                if self._stale:
+                    self.refresh()
+        return self
+
+
+def get_gallery() -> Gallery:
+    """Get the application's recognition gallery, loading it if needed"""
+    gallery = current_app.extensions.get('gallery')
+    if gallery is None:
+        gallery = current_app.extensions.setdefault('gallery', Gallery(current_app.config.get('GALLERY_PATH')))
+    return gallery.ensure_loaded()
+
+
+def invalidate_gallery():
+    """Invalidate the application's recognition gallery after enrollment changes"""
+    gallery = current_app.extensions.get('gallery')
+    if gallery is not None:
+        gallery.invalidate()
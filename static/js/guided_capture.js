@@ -7,6 +7,7 @@ const REQUIRED_POSES = ['front', 'left', 'right']; // Simplified: removed 'up',
 const VALIDATION_INTERVAL = 800; // ms (increased from 500ms for smoother feedback)
 const COUNTDOWN_SECONDS = 3;
 const FRAMES_TO_HOLD = 1; // Reduced from 2 - captures faster (~0.8s hold)
+const FRAME_ACK_TIMEOUT = 5000; // ms to wait for the server to answer a streamed frame
 
 let webcamStream = null;
 let currentPoseIndex = 0;
@@ -15,6 +16,7 @@ let validationTimer = null;
 let countdownTimer = null;
 let isCountingDown = false;
 let isProcessing = false;
+let isValidating = false; // A validation request is in flight; skip ticks until it returns
 let employeeData = null;
 let stabilityCounter = 0; // Tracks consecutive "ready" frames
 
@@ -30,6 +32,9 @@ const capturedImagesGrid = document.getElementById('captured-images-grid');
 const noCaptures = document.getElementById('no-captures');
 const confirmEnrollmentBtn = document.getElementById('confirm-enrollment-btn');
 
+// Socket.IO connection for streaming preview frames (HTTP fallback if unavailable)
+const frameSocket = typeof io !== 'undefined' ? io('/enroll') : null;
+
 // Load employee data
 function loadEmployeeData() {
     const data = sessionStorage.getItem('enrollmentData');
@@ -320,9 +325,32 @@ function updateFeedbackDisplay(data) {
     feedbackText.innerHTML = feedbackHTML;
 }
 
+// Encode the current canvas contents as a JPEG blob
+function canvasToBlob() {
+    return new Promise(resolve => canvas.toBlob(resolve, 'image/jpeg', 0.9));
+}
+
+// Send a preview frame for validation and return the server's result
+async function sendFrame(imageBlob, poseType) {
+    if (frameSocket && frameSocket.connected) {
+        // The result comes back as the event acknowledgement
+        return frameSocket.timeout(FRAME_ACK_TIMEOUT).emitWithAck('frame', {
+            pose_type: poseType,
+            image: await imageBlob.arrayBuffer()
+        });
+    }
+
+    const response = await fetch(`/enroll/api/validate_frame?pose_type=${encodeURIComponent(poseType)}`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/octet-stream' },
+        body: imageBlob
+    });
+    return response.json();
+}
+
 // Validate frame
 async function validateFrame() {
-    if (isCountingDown || isProcessing) return;
+    if (isCountingDown || isProcessing || isValidating) return;
 
     const currentPose = getCurrentPose();
     if (!currentPose) {
@@ -332,21 +360,17 @@ async function validateFrame() {
 
     console.log(`Validating frame for pose: ${currentPose}, index: ${currentPoseIndex}`);
 
-    // Capture current frame
-    ctx.drawImage(video, 0, 0, canvas.width, canvas.height);
-    const imageData = canvas.toDataURL('image/jpeg', 0.9);
+    isValidating = true;
 
     try {
-        const response = await fetch('/enroll/api/validate_frame', {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({
-                image: imageData,
-                pose_type: currentPose
-            })
-        });
+        // Capture current frame and send it as raw JPEG bytes (no base64)
+        ctx.drawImage(video, 0, 0, canvas.width, canvas.height);
+        const imageBlob = await canvasToBlob();
 
-        const data = await response.json();
+        const data = await sendFrame(imageBlob, currentPose);
+
+        // Server was busy with other frames; keep the current feedback
+        if (data.skipped) return;
 
         if (data.success) {
             // === ENHANCED DEBUG LOGGING ===
@@ -394,7 +418,7 @@ async function validateFrame() {
 
                 // Only start countdown if we've been stable for enough frames
                 if (stabilityCounter >= FRAMES_TO_HOLD && !isCountingDown) {
-                    startCountdown(imageData);
+                    startCountdown(imageBlob);
                     stabilityCounter = 0; // Reset for next pose
                 }
             } else {
@@ -407,11 +431,13 @@ async function validateFrame() {
         }
     } catch (error) {
         console.error('Validation error:', error);
+    } finally {
+        isValidating = false;
     }
 }
 
 // Start countdown
-function startCountdown(imageData) {
+function startCountdown(imageBlob) {
     isCountingDown = true;
     let count = COUNTDOWN_SECONDS;
 
@@ -425,13 +451,13 @@ function startCountdown(imageData) {
             countdownDiv.textContent = count;
         } else {
             clearInterval(countdownTimer);
-            captureImage(imageData);
+            captureImage(imageBlob);
         }
     }, 1000);
 }
 
 // Capture image
-function captureImage(imageData) {
+function captureImage(imageBlob) {
     isCountingDown = false;
     isProcessing = true;
 
@@ -447,10 +473,10 @@ function captureImage(imageData) {
     const currentPose = getCurrentPose();
 
     // Store captured image
-    capturedImages[currentPose] = imageData;
+    capturedImages[currentPose] = imageBlob;
 
     // Add to display
-    addCapturedImageToDisplay(currentPose, imageData);
+    addCapturedImageToDisplay(currentPose, imageBlob);
 
     // Move to next pose
     currentPoseIndex++;
@@ -479,7 +505,7 @@ function captureImage(imageData) {
 }
 
 // Add captured image to display
-function addCapturedImageToDisplay(poseType, imageData) {
+function addCapturedImageToDisplay(poseType, imageBlob) {
     noCaptures.style.display = 'none';
 
     const poseLabels = {
@@ -493,7 +519,7 @@ function addCapturedImageToDisplay(poseType, imageData) {
     const col = document.createElement('div');
     col.className = 'col-6';
     col.innerHTML = `
-        <img src="${imageData}" class="captured-image" alt="${poseType}">
+        <img src="${URL.createObjectURL(imageBlob)}" class="captured-image" alt="${poseType}">
         <div class="pose-label text-success">
             <i class="bi bi-check-circle-fill"></i> ${poseLabels[poseType]}
         </div>
@@ -534,15 +560,19 @@ confirmEnrollmentBtn.addEventListener('click', async function() {
     this.innerHTML = '<span class="spinner-border spinner-border-sm me-2"></span>Enrolling...';
 
     try {
-        const enrollmentPayload = {
-            ...employeeData,
-            images: capturedImages
-        };
+        // Employee fields as form fields, one JPEG part per pose
+        const formData = new FormData();
+        for (const [field, value] of Object.entries(employeeData)) {
+            formData.append(field, value ?? '');
+        }
+        for (const [poseType, imageBlob] of Object.entries(capturedImages)) {
+            formData.append(poseType, imageBlob, `${poseType}.jpg`);
+        }
 
+        // Browser sets the multipart Content-Type with its boundary
         const response = await fetch('/enroll/api/enroll', {
             method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify(enrollmentPayload)
+            body: formData
         });
 
         const data = await response.json();
@@ -617,6 +647,9 @@ window.addEventListener('beforeunload', function() {
     if (webcamStream) {
         webcamStream.getTracks().forEach(track => track.stop());
     }
+    if (frameSocket) {
+        frameSocket.disconnect();
+    }
     if (validationTimer) {
         clearInterval(validationTimer);
     }
@@ -2,5 +2,9 @@
 from .quality_checker import ImageQualityChecker
 from .pose_estimator import PoseEstimator
 from .guided_enrollment import GuidedEnrollment
+from .image_io import decode_image, read_jpeg_size, save_image, save_image_async
 
-__all__ = ['ImageQualityChecker', 'PoseEstimator', 'GuidedEnrollment']
+__all__ = [
+    'ImageQualityChecker', 'PoseEstimator', 'GuidedEnrollment',
+    'decode_image', 'read_jpeg_size', 'save_image', 'save_image_async'
+]
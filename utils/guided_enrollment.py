@@ -4,6 +4,7 @@ Coordinates multi-pose capture with quality checks and pose validation
 """
 import cv2
 import numpy as np
+from functools import lru_cache
 from typing import Dict, List, Optional, Tuple
 from .quality_checker import ImageQualityChecker
 from .pose_estimator import PoseEstimator
@@ -11,6 +12,51 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Feedback overlay text style
+FEEDBACK_FONT = cv2.FONT_HERSHEY_SIMPLEX
+FEEDBACK_FONT_SCALE = 0.7
+FEEDBACK_FONT_THICKNESS = 2
+
+
+@lru_cache(maxsize=256)
+def _wrap_feedback(text: str, max_width: int) -> Tuple[Tuple[str, int, int, int], ...]:
+    """
+    Word-wrap feedback text to a pixel width
+
+    Feedback strings repeat from frame to frame, so the wrapped lines and
+    their text sizes are memoized instead of measured on every draw.
+
+    Args:
+        text: Feedback text
+        max_width: Maximum line width in pixels
+
+    Returns:
+        Tuple of (line, text_width, text_height, baseline) per line
+    """
+    lines = []
+    current_line = []
+
+    for word in text.split():
+        test_line = ' '.join(current_line + [word])
+        (text_width, _), _ = cv2.getTextSize(test_line, FEEDBACK_FONT, FEEDBACK_FONT_SCALE, FEEDBACK_FONT_THICKNESS)
+
+        if text_width <= max_width:
+            current_line.append(word)
+        else:
+            if current_line:
+                lines.append(' '.join(current_line))
+            current_line = [word]
+
+    if current_line:
+        lines.append(' '.join(current_line))
+
+    wrapped = []
+    for line in lines:
+        (text_width, text_height), baseline = cv2.getTextSize(line, FEEDBACK_FONT, FEEDBACK_FONT_SCALE, FEEDBACK_FONT_THICKNESS)
+        wrapped.append((line, text_width, text_height, baseline))
+
+    return tuple(wrapped)
+
 
 class GuidedEnrollment:
     """Manage guided enrollment process with multi-pose capture"""
@@ -96,21 +142,23 @@ class GuidedEnrollment:
         # Perform quality checks
         quality_results = self.quality_checker.check_all(image, face_bbox, landmarks)
 
-        # Estimate pose
-        pose = self.pose_estimator.estimate_pose(landmarks, image.shape)
-
-        # Check pose requirement
+        # Estimate and check pose only when quality passes; a failing frame
+        # cannot be captured either way, so the solvePnP call is skipped
+        pose = None
         pose_pass = False
         pose_feedback = ""
 
-        if pose is not None:
-            pose_pass, pose_feedback = self.pose_estimator.check_pose_requirement(
-                pose,
-                current_pose,
-                self.pose_requirements
-            )
-        else:
-            pose_feedback = "Could not detect head pose"
+        if quality_results['overall_pass']:
+            pose = self.pose_estimator.estimate_pose(landmarks, image.shape)
+
+            if pose is not None:
+                pose_pass, pose_feedback = self.pose_estimator.check_pose_requirement(
+                    pose,
+                    current_pose,
+                    self.pose_requirements
+                )
+            else:
+                pose_feedback = "Could not detect head pose"
 
         # Combine feedback
         feedback_messages = []
@@ -149,7 +197,8 @@ class GuidedEnrollment:
         Capture the current pose if validation passes
 
         Args:
-            image: Input image to capture
+            image: Input image to capture; stored by reference, so pass a
+                freshly decoded frame and do not modify it afterwards
             validation_result: Result from validate_frame
 
         Returns:
@@ -165,7 +214,7 @@ class GuidedEnrollment:
             return False
 
         # Store image and metadata
-        self.captured_images[current_pose] = image.copy()
+        self.captured_images[current_pose] = image
         self.capture_metadata[current_pose] = {
             'quality_score': validation_result['quality_score'],
             'pose': validation_result['pose'],
@@ -191,7 +240,8 @@ class GuidedEnrollment:
         self,
         image: np.ndarray,
         validation_result: Dict,
-        face_bbox: Tuple[int, int, int, int] = None
+        face_bbox: Tuple[int, int, int, int] = None,
+        inplace: bool = False
     ) -> np.ndarray:
         """
         Draw visual feedback on image
@@ -200,11 +250,12 @@ class GuidedEnrollment:
             image: Input image
             validation_result: Validation result
             face_bbox: Optional face bounding box
+            inplace: Draw directly on `image` instead of a copy (for frames the caller owns)
 
         Returns:
             Image with feedback overlay
         """
-        output = image.copy()
+        output = image if inplace else image.copy()
         height, width = output.shape[:2]
 
         # Draw bounding box if provided
@@ -222,38 +273,14 @@ class GuidedEnrollment:
             cv2.rectangle(output, (x1, y1), (x2, y2), color, thickness)
 
         # Draw feedback text
-        feedback_text = validation_result['feedback']
-
-        # Background for text
-        font = cv2.FONT_HERSHEY_SIMPLEX
-        font_scale = 0.7
-        font_thickness = 2
+        font = FEEDBACK_FONT
 
         # Split feedback into multiple lines if too long
-        max_width = width - 40
-        words = feedback_text.split()
-        lines = []
-        current_line = []
-
-        for word in words:
-            test_line = ' '.join(current_line + [word])
-            (text_width, text_height), _ = cv2.getTextSize(test_line, font, font_scale, font_thickness)
-
-            if text_width <= max_width:
-                current_line.append(word)
-            else:
-                if current_line:
-                    lines.append(' '.join(current_line))
-                current_line = [word]
-
-        if current_line:
-            lines.append(' '.join(current_line))
+        lines = _wrap_feedback(validation_result['feedback'], width - 40)
 
         # Draw lines
         y_offset = 30
-        for line in lines:
-            (text_width, text_height), baseline = cv2.getTextSize(line, font, font_scale, font_thickness)
-
+        for line, text_width, text_height, baseline in lines:
             # Background rectangle
             cv2.rectangle(
                 output,
@@ -269,9 +296,9 @@ class GuidedEnrollment:
                 line,
                 (15, y_offset),
                 font,
-                font_scale,
+                FEEDBACK_FONT_SCALE,
                 (255, 255, 255),
-                font_thickness
+                FEEDBACK_FONT_THICKNESS
             )
 
             y_offset += text_height + baseline + 10
@@ -0,0 +1,131 @@
+"""
+Image I/O helpers
+Decode uploaded frames at the smallest resolution the detector needs and
+write captured images to disk off the request thread
+"""
+import cv2
+import numpy as np
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Background writer for JPEGs saved during requests (cv2.imwrite releases the GIL)
+_io_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix='image-io')
+
+# Quality 85 with optimized Huffman tables: much smaller files than the default 95
+JPEG_WRITE_PARAMS = [cv2.IMWRITE_JPEG_QUALITY, 85, cv2.IMWRITE_JPEG_OPTIMIZE, 1]
+
+# JPEG start-of-frame markers carrying the image dimensions
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+# libjpeg DCT-domain downscale factors supported by cv2.imdecode
+_REDUCED_COLOR_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+
+def read_jpeg_size(image_bytes: bytes) -> Optional[Tuple[int, int]]:
+    """
+    Read image dimensions from a JPEG header without decoding
+
+    Args:
+        image_bytes: Encoded image bytes
+
+    Returns:
+        Tuple of (width, height), or None if not a parseable JPEG
+    """
+    if image_bytes[:2] != b'\xff\xd8':
+        return None
+
+    i = 2
+    length = len(image_bytes)
+    while i + 9 < length:
+        if image_bytes[i] != 0xFF:
+            i += 1
+            continue
+
+        marker = image_bytes[i + 1]
+        if marker == 0xFF:
+            i += 1
+            continue
+
+        if marker in _JPEG_SOF_MARKERS:
+            height = int.from_bytes(image_bytes[i + 5:i + 7], 'big')
+            width = int.from_bytes(image_bytes[i + 7:i + 9], 'big')
+            return width, height
+
+        # Skip this segment using its length field
+        segment_length = int.from_bytes(image_bytes[i + 2:i + 4], 'big')
+        i += 2 + segment_length
+
+    return None
+
+
+def decode_image(image_bytes: bytes, min_size: Optional[int] = None) -> Optional[np.ndarray]:
+    """
+    Decode an encoded image to a BGR array
+
+    Args:
+        image_bytes: Encoded image bytes (JPEG, PNG, ...)
+        min_size: If given, decode JPEGs at a reduced scale as long as the
+            longest side stays at or above this many pixels
+
+    Returns:
+        Decoded BGR image, or None if decoding fails
+    """
+    nparr = np.frombuffer(image_bytes, np.uint8)
+
+    flag = cv2.IMREAD_COLOR
+    if min_size is not None:
+        size = read_jpeg_size(image_bytes)
+        if size is not None:
+            longest_side = max(size)
+            for factor, reduced_flag in _REDUCED_COLOR_FLAGS:
+                if longest_side // factor >= min_size:
+                    flag = reduced_flag
+                    logger.debug("Decoding %dx%d JPEG at 1/%d scale", size[0], size[1], factor)
+                    break
+
+    return cv2.imdecode(nparr, flag)
+
+
+def save_image(path: str, image: np.ndarray) -> bool:
+    """
+    Write an image to disk, logging any failure
+
+    JPEGs are written with JPEG_WRITE_PARAMS.
+
+    Args:
+        path: Destination file path
+        image: Image to write (BGR)
+
+    Returns:
+        True if the image was written
+    """
+    try:
+        params = JPEG_WRITE_PARAMS if path.lower().endswith(('.jpg', '.jpeg')) else []
+        if not cv2.imwrite(path, image, params):
+            logger.error(f"Failed to write image: {path}")
+            return False
+        return True
+    except Exception as e:
+        logger.error(f"Failed to write image {path}: {e}")
+        return False
+
+
+def save_image_async(path: str, image: np.ndarray) -> Future:
+    """
+    Write an image to disk on the background I/O thread pool
+
+    Args:
+        path: Destination file path
+        image: Image to write (BGR); must not be modified afterwards
+
+    Returns:
+        Future resolving to True if the image was written
+    """
+    return _io_pool.submit(save_image, path, image)
@@ -3,18 +3,113 @@ Head Pose Estimation for Guided Enrollment
 Estimates yaw, pitch, and roll from facial landmarks
 """
 import cv2
+import math
+import threading
 import numpy as np
-from typing import Tuple, Dict, Optional
+from typing import Hashable, Tuple, Dict, Optional
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Globally optimal O(n) PnP solver (OpenCV >= 4.5.3) used for cold starts
+_COLD_START_PNP_FLAG = getattr(cv2, 'SOLVEPNP_SQPNP', cv2.SOLVEPNP_ITERATIVE)
+
+# Most PnP warm-start seeds kept at once (one per client and frame size)
+MAX_WARM_START_TRACKS = 64
+
+# Most camera matrices cached at once (one per frame size)
+MAX_CAMERA_MATRICES = 16
+
+# Average face proportions for the closed-form estimator (5-point landmarks)
+NOSE_DEPTH_RATIO = 0.5         # Nose tip depth in front of the eyes / interocular distance
+NOSE_HEIGHT_RATIO = 0.5        # Nose tip position between eye line and mouth line (ArcFace template)
+NOSE_PITCH_DEPTH_RATIO = 0.45  # Nose tip depth / eye-to-mouth distance
+
+# Maps the 5 InsightFace landmarks [left_eye, right_eye, nose, left_mouth, right_mouth]
+# to the 6 PnP image points [nose_tip, chin, left_eye, right_eye, left_mouth, right_mouth],
+# one 6x5 matrix per coordinate. The chin is the mouth midpoint pushed down by half the
+# nose-to-mouth height: chin_y = 0.75 * (left_mouth_y + right_mouth_y) - 0.5 * nose_y
+PNP_LANDMARK_MIX = np.array([
+    [   # x
+        [0, 0, 1, 0, 0],
+        [0, 0, 0, 0.5, 0.5],
+        [1, 0, 0, 0, 0],
+        [0, 1, 0, 0, 0],
+        [0, 0, 0, 1, 0],
+        [0, 0, 0, 0, 1],
+    ],
+    [   # y
+        [0, 0, 1, 0, 0],
+        [0, 0, -0.5, 0.75, 0.75],
+        [1, 0, 0, 0, 0],
+        [0, 1, 0, 0, 0],
+        [0, 0, 0, 1, 0],
+        [0, 0, 0, 0, 1],
+    ],
+], dtype=np.float32)
+
+# Corrective feedback keyed by (pose_type, side of the allowed range the angle is on);
+# 'under' is below the minimum, 'over' above the maximum
+YAW_FEEDBACK = {
+    ('left', 'over'): "Turn MORE to the LEFT",
+    ('left', 'under'): "Turn LESS to the left",
+    ('right', 'under'): "Turn MORE to the RIGHT",
+    ('right', 'over'): "Turn LESS to the right",
+    ('front', 'under'): "Turn RIGHT to center",
+    ('front', 'over'): "Turn LEFT to center",
+}
+PITCH_FEEDBACK = {
+    ('up', 'under'): "Tilt head UP more",
+    ('up', 'over'): "Tilt head down less",
+    ('down', 'over'): "Tilt head DOWN more",
+    ('down', 'under'): "Tilt head up less",
+    ('front', 'under'): "Tilt head UP",
+    ('front', 'over'): "Tilt head DOWN",
+}
+
+
+def _rotation_vector_to_euler(rotation_vec: np.ndarray) -> Tuple[float, float, float]:
+    """
+    Convert a Rodrigues rotation vector to (yaw, pitch, roll) in degrees
+
+    Builds only the five rotation-matrix entries the Euler extraction needs,
+    in closed form on Python floats, instead of the full matrix via cv2.Rodrigues.
+    """
+    rx, ry, rz = rotation_vec.ravel().tolist()
+    theta = math.sqrt(rx * rx + ry * ry + rz * rz)
+    if theta < 1e-12:
+        return 0.0, 0.0, 0.0
+
+    kx, ky, kz = rx / theta, ry / theta, rz / theta
+    c, s = math.cos(theta), math.sin(theta)
+    t = 1.0 - c
+
+    # R = c*I + s*[k]x + t*k*k^T
+    r00 = c + t * kx * kx
+    r10 = t * kx * ky + s * kz
+    r20 = t * kx * kz - s * ky
+    r21 = t * ky * kz + s * kx
+    r22 = c + t * kz * kz
+
+    yaw = math.degrees(math.atan2(r10, r00))
+    pitch = math.degrees(math.atan2(-r20, math.hypot(r21, r22)))
+    roll = math.degrees(math.atan2(r21, r22))
+    return yaw, pitch, roll
+
 
 class PoseEstimator:
     """Estimate head pose from facial landmarks"""
 
-    def __init__(self):
-        """Initialize pose estimator with 3D model points"""
+    def __init__(self, use_pnp: bool = False):
+        """
+        Initialize pose estimator with 3D model points
+
+        Args:
+            use_pnp: Estimate pose with solvePnP against the 3D face model
+                instead of the closed-form landmark geometry (for calibration)
+        """
+        self.use_pnp = use_pnp
+
         # 3D model points of facial landmarks (in mm)
         # Reference: Generic human face model
         self.model_points = np.array([
@@ -24,12 +119,23 @@ class PoseEstimator:
             (225.0, 170.0, -135.0),      # Right eye right corner
             (-150.0, -150.0, -125.0),    # Left mouth corner
             (150.0, -150.0, -125.0)      # Right mouth corner
-        ], dtype=np.float64)
+        ], dtype=np.float32)
+
+        # Last PnP solution (rvec, tvec) per (track_id, width, height), used to
+        # warm-start that client's next frame; frames without a track_id always cold-start
+        self._solutions: Dict[Tuple[Hashable, int, int], tuple] = {}
+        self._solutions_lock = threading.Lock()
+
+        # Approximate camera matrices keyed by (width, height); no lens distortion
+        self._camera_matrices: Dict[Tuple[int, int], np.ndarray] = {}
+        self._camera_matrices_lock = threading.Lock()
+        self._dist_coeffs = np.zeros((4, 1))
 
     def estimate_pose(
         self,
         landmarks: np.ndarray,
-        image_shape: Tuple[int, int]
+        image_shape: Tuple[int, int],
+        track_id: Optional[Hashable] = None
     ) -> Optional[Dict[str, float]]:
         """
         Estimate head pose from facial landmarks
@@ -37,6 +143,8 @@ class PoseEstimator:
         Args:
             landmarks: 5 facial landmarks from InsightFace (left_eye, right_eye, nose, left_mouth, right_mouth)
             image_shape: Image shape (height, width)
+            track_id: Optional ID of the client the frames come from (e.g. a Socket.IO sid);
+                the PnP solve is warm-started only from that client's previous frame
 
         Returns:
             Dictionary with yaw, pitch, roll angles in degrees, or None if estimation fails
@@ -45,85 +153,161 @@ class PoseEstimator:
             logger.warning("Insufficient landmarks for pose estimation")
             return None
 
+        if not self.use_pnp:
+            return self.estimate_pose_fast(landmarks)
+
         height, width = image_shape[:2]
 
-        # Convert InsightFace 5-point landmarks to 6 points needed for pose estimation
-        # InsightFace format: [left_eye, right_eye, nose, left_mouth, right_mouth]
-        # We need: [nose_tip, chin, left_eye_left, right_eye_right, left_mouth, right_mouth]
-
-        # Extract points
-        left_eye = landmarks[0]
-        right_eye = landmarks[1]
-        nose = landmarks[2]
-        left_mouth = landmarks[3]
-        right_mouth = landmarks[4]
-
-        # Estimate chin position (below mouth)
-        mouth_center = (left_mouth + right_mouth) / 2
-        chin = mouth_center + np.array([0, (mouth_center[1] - nose[1]) * 0.5])
-
-        # 2D image points
-        image_points = np.array([
-            nose,           # Nose tip
-            chin,           # Chin
-            left_eye,       # Left eye (approximation)
-            right_eye,      # Right eye (approximation)
-            left_mouth,     # Left mouth corner
-            right_mouth     # Right mouth corner
-        ], dtype=np.float64)
-
-        # Camera internals (approximate)
-        focal_length = width
-        center = (width / 2, height / 2)
-        camera_matrix = np.array(
-            [[focal_length, 0, center[0]],
-             [0, focal_length, center[1]],
-             [0, 0, 1]], dtype=np.float64
+        # Convert InsightFace 5-point landmarks to the 6 points needed for pose
+        # estimation (with an estimated chin) in one mixing-matrix product
+        image_points = np.einsum(
+            'cpk,kc->pc', PNP_LANDMARK_MIX, np.asarray(landmarks[:5], dtype=np.float32), order='C'
         )
 
-        # Assuming no lens distortion
-        dist_coeffs = np.zeros((4, 1))
+        camera_matrix = self._get_camera_matrix(width, height)
+        dist_coeffs = self._dist_coeffs
 
-        # Solve PnP
+        # Solve PnP: refine from this client's previous frame when there is one,
+        # otherwise cold-start with SQPnP
+        key = (track_id, width, height) if track_id is not None else None
+        last_solution = self._solutions.get(key) if key is not None else None
         try:
-            success, rotation_vec, translation_vec = cv2.solvePnP(
-                self.model_points,
-                image_points,
-                camera_matrix,
-                dist_coeffs,
-                flags=cv2.SOLVEPNP_ITERATIVE
-            )
+            if last_solution is not None:
+                success, rotation_vec, translation_vec = cv2.solvePnP(
+                    self.model_points,
+                    image_points,
+                    camera_matrix,
+                    dist_coeffs,
+                    rvec=last_solution[0].copy(),
+                    tvec=last_solution[1].copy(),
+                    useExtrinsicGuess=True,
+                    flags=cv2.SOLVEPNP_ITERATIVE
+                )
+            else:
+                success, rotation_vec, translation_vec = cv2.solvePnP(
+                    self.model_points,
+                    image_points,
+                    camera_matrix,
+                    dist_coeffs,
+                    flags=_COLD_START_PNP_FLAG
+                )
 
             if not success:
                 logger.warning("PnP solver failed")
+                self._store_solution(key, None)
                 return None
 
-            # Convert rotation vector to rotation matrix
-            rotation_mat, _ = cv2.Rodrigues(rotation_vec)
+            # Stored as one tuple so concurrent requests never see a mixed solution
+            self._store_solution(key, (rotation_vec, translation_vec))
 
-            # Calculate Euler angles
-            # Extract yaw, pitch, roll
-            yaw = np.arctan2(rotation_mat[1, 0], rotation_mat[0, 0])
-            pitch = np.arctan2(-rotation_mat[2, 0], np.sqrt(rotation_mat[2, 1]**2 + rotation_mat[2, 2]**2))
-            roll = np.arctan2(rotation_mat[2, 1], rotation_mat[2, 2])
+            yaw_deg, pitch_deg, roll_deg = _rotation_vector_to_euler(rotation_vec)
 
-            # Convert to degrees
-            yaw_deg = np.degrees(yaw)
-            pitch_deg = np.degrees(pitch)
-            roll_deg = np.degrees(roll)
-
-            logger.debug(f"Pose: yaw={yaw_deg:.1f}°, pitch={pitch_deg:.1f}°, roll={roll_deg:.1f}°")
+            logger.debug("Pose: yaw=%.1f°, pitch=%.1f°, roll=%.1f°", yaw_deg, pitch_deg, roll_deg)
 
             return {
-                'yaw': float(yaw_deg),
-                'pitch': float(pitch_deg),
-                'roll': float(roll_deg)
+                'yaw': yaw_deg,
+                'pitch': pitch_deg,
+                'roll': roll_deg
             }
 
         except Exception as e:
             logger.error(f"Pose estimation error: {e}")
+            self._store_solution(key, None)
+            return None
+
+    def _store_solution(self, key: Optional[Tuple[Hashable, int, int]], solution: Optional[tuple]):
+        """Remember (or forget, if `solution` is None) the warm-start seed for a track"""
+        if key is None:
+            return
+
+        with self._solutions_lock:
+            self._solutions.pop(key, None)
+            if solution is None:
+                return
+            self._solutions[key] = solution
+            # Evict the least recently updated tracks (dicts keep insertion order)
+            while len(self._solutions) > MAX_WARM_START_TRACKS:
+                del self._solutions[next(iter(self._solutions))]
+
+    def reset_track(self, track_id: Hashable):
+        """Forget the warm-start seeds of a client, e.g. when it disconnects"""
+        with self._solutions_lock:
+            for key in [key for key in self._solutions if key[0] == track_id]:
+                del self._solutions[key]
+
+    def _get_camera_matrix(self, width: int, height: int) -> np.ndarray:
+        """Get the approximate camera matrix for a frame size, building it on first use"""
+        camera_matrix = self._camera_matrices.get((width, height))
+        if camera_matrix is None:
+            # Camera internals (approximate)
+            focal_length = width
+            center = (width / 2, height / 2)
+            camera_matrix = np.array(
+                [[focal_length, 0, center[0]],
+                 [0, focal_length, center[1]],
+                 [0, 0, 1]], dtype=np.float64
+            )
+            with self._camera_matrices_lock:
+                self._camera_matrices[(width, height)] = camera_matrix
+                # Evict the oldest frame sizes (dicts keep insertion order)
+                while len(self._camera_matrices) > MAX_CAMERA_MATRICES:
+                    del self._camera_matrices[next(iter(self._camera_matrices))]
+        return camera_matrix
+
+    def estimate_pose_fast(self, landmarks: np.ndarray) -> Optional[Dict[str, float]]:
+        """
+        Estimate head pose in closed form from the 5 landmark positions
+
+        Roll is the angle of the eye line. Yaw and pitch come from how far the
+        nose tip is displaced from where it sits on a frontal face, measured
+        in the eye-line frame and scaled by average face proportions.
+
+        Args:
+            landmarks: 5 facial landmarks from InsightFace (left_eye, right_eye, nose, left_mouth, right_mouth)
+
+        Returns:
+            Dictionary with yaw, pitch, roll angles in degrees, or None if the landmarks are degenerate
+        """
+        (lx, ly), (rx, ry), (nx, ny), (lmx, lmy), (rmx, rmy) = landmarks[:5]
+
+        eye_dx = rx - lx
+        eye_dy = ry - ly
+        interocular = math.hypot(eye_dx, eye_dy)
+        if interocular == 0:
             return None
 
+        # Unit vectors along the eye line (u) and perpendicular, pointing down the face (v)
+        ux, uy = eye_dx / interocular, eye_dy / interocular
+        vx, vy = -uy, ux
+
+        eye_mid_x, eye_mid_y = (lx + rx) / 2, (ly + ry) / 2
+        mouth_mid_x, mouth_mid_y = (lmx + rmx) / 2, (lmy + rmy) / 2
+
+        face_height = (mouth_mid_x - eye_mid_x) * vx + (mouth_mid_y - eye_mid_y) * vy
+        if face_height <= 0:
+            return None
+
+        # Nose tip offset from the eye midpoint in the eye-line frame
+        nose_dx = (nx - eye_mid_x) * ux + (ny - eye_mid_y) * uy
+        nose_dy = (nx - eye_mid_x) * vx + (ny - eye_mid_y) * vy
+
+        roll = math.degrees(math.atan2(eye_dy, eye_dx))
+        # Turning to the subject's left moves the nose toward image right (negative yaw)
+        yaw = -math.degrees(math.atan2(nose_dx, NOSE_DEPTH_RATIO * interocular))
+        # Tilting up moves the nose toward the eyes (positive pitch)
+        pitch = math.degrees(math.atan2(
+            NOSE_HEIGHT_RATIO * face_height - nose_dy,
+            NOSE_PITCH_DEPTH_RATIO * face_height
+        ))
+
+        logger.debug("Pose: yaw=%.1f°, pitch=%.1f°, roll=%.1f°", yaw, pitch, roll)
+
+        return {
+            'yaw': float(yaw),
+            'pitch': float(pitch),
+            'roll': float(roll)
+        }
+
     def check_pose_requirement(
         self,
         pose: Dict[str, float],
@@ -152,50 +336,25 @@ class PoseEstimator:
         yaw = pose['yaw']
         pitch = pose['pitch']
 
-        # Check yaw range
+        # Which side of each allowed range the angles fall on
         yaw_min, yaw_max = requirements['yaw']
-        yaw_ok = yaw_min <= yaw <= yaw_max
+        yaw_side = 'under' if yaw < yaw_min else 'over' if yaw > yaw_max else None
 
-        # Check pitch range
         pitch_min, pitch_max = requirements['pitch']
-        pitch_ok = pitch_min <= pitch <= pitch_max
+        pitch_side = 'under' if pitch < pitch_min else 'over' if pitch > pitch_max else None
 
         # Generate feedback message
-        if yaw_ok and pitch_ok:
+        if yaw_side is None and pitch_side is None:
             return True, f"Good! Hold still..."
 
         # Provide specific feedback
         feedback = []
 
-        if not yaw_ok:
-            if pose_type == 'left' and yaw > yaw_max:
-                feedback.append("Turn MORE to the LEFT")
-            elif pose_type == 'left' and yaw < yaw_min:
-                feedback.append("Turn LESS to the left")
-            elif pose_type == 'right' and yaw < yaw_min:
-                feedback.append("Turn MORE to the RIGHT")
-            elif pose_type == 'right' and yaw > yaw_max:
-                feedback.append("Turn LESS to the right")
-            elif pose_type == 'front':
-                if yaw < 0:
-                    feedback.append("Turn RIGHT to center")
-                else:
-                    feedback.append("Turn LEFT to center")
-
-        if not pitch_ok:
-            if pose_type == 'up' and pitch < pitch_min:
-                feedback.append("Tilt head UP more")
-            elif pose_type == 'up' and pitch > pitch_max:
-                feedback.append("Tilt head down less")
-            elif pose_type == 'down' and pitch > pitch_max:
-                feedback.append("Tilt head DOWN more")
-            elif pose_type == 'down' and pitch < pitch_min:
-                feedback.append("Tilt head up less")
-            elif pose_type == 'front':
-                if pitch < 0:
-                    feedback.append("Tilt head UP")
-                else:
-                    feedback.append("Tilt head DOWN")
+        if yaw_side is not None and (pose_type, yaw_side) in YAW_FEEDBACK:
+            feedback.append(YAW_FEEDBACK[(pose_type, yaw_side)])
+
+        if pitch_side is not None and (pose_type, pitch_side) in PITCH_FEEDBACK:
+            feedback.append(PITCH_FEEDBACK[(pose_type, pitch_side)])
 
         return False, " | ".join(feedback) if feedback else "Adjust head position"
 
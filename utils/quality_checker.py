@@ -4,11 +4,23 @@ Critical for ensuring good quality images, especially for darker skin tones
 """
 import cv2
 import numpy as np
-from typing import Dict, Tuple
+from typing import Dict, Optional, Tuple
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Minimum eye distance relative to face box width (allows strong yaw for left/right poses)
+MIN_EYE_DISTANCE_RATIO = 0.1
+
+# Pixel statistics are computed on at most this many pixels across
+QUALITY_CHECK_WIDTH = 480
+
+# Frames are downscaled to this width for the blur check when no face box is known
+BLUR_CHECK_WIDTH = 320
+
+# Checks run by _check_pixels on every frame
+PIXEL_CHECKS = ('brightness', 'contrast', 'blur')
+
 
 class ImageQualityChecker:
     """Check image quality for face recognition"""
@@ -21,7 +33,9 @@ class ImageQualityChecker:
         min_contrast: float = 30.0,
         min_face_size: float = 0.15,
         max_face_size: float = 0.70,
-        max_center_offset: float = 0.20
+        max_center_offset: float = 0.20,
+        use_opencl: bool = False,
+        use_face_region: bool = False
     ):
         """
         Initialize quality checker
@@ -34,6 +48,10 @@ class ImageQualityChecker:
             min_face_size: Minimum face size relative to frame (0.15 = 15%)
             max_face_size: Maximum face size relative to frame (0.70 = 70%)
             max_center_offset: Maximum offset from center (0.20 = 20%)
+            use_opencl: Run the pixel checks through OpenCV's OpenCL (T-API) backend
+                when the OpenCV build has a usable OpenCL device
+            use_face_region: Measure blur, brightness and contrast on the face box instead
+                of the whole frame (the thresholds must be tuned for face-region statistics)
         """
         self.min_blur_threshold = min_blur_threshold
         self.min_brightness = min_brightness
@@ -42,6 +60,64 @@ class ImageQualityChecker:
         self.min_face_size = min_face_size
         self.max_face_size = max_face_size
         self.max_center_offset = max_center_offset
+        self.use_face_region = use_face_region
+
+        # Fall back to the CPU path when OpenCV has no OpenCL device
+        self.use_opencl = use_opencl and cv2.ocl.haveOpenCL()
+        if self.use_opencl:
+            cv2.ocl.setUseOpenCL(True)
+            logger.info("Quality checks using OpenCL device: %s", cv2.ocl.Device_getDefault().name())
+        elif use_opencl:
+            logger.warning("OpenCL requested but not available, quality checks will run on the CPU")
+
+    @staticmethod
+    def _to_gray(image: np.ndarray) -> np.ndarray:
+        """Convert a BGR image to grayscale (grayscale input is returned as-is)"""
+        if len(image.shape) == 3:
+            return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        return image
+
+    @staticmethod
+    def _mean_std(image) -> Tuple[float, float]:
+        """Mean and standard deviation of a single-channel image or UMat"""
+        mean, std = cv2.meanStdDev(image)
+        # UMat input gives UMat results; copy the two scalars back to the host
+        if isinstance(mean, cv2.UMat):
+            mean, std = mean.get(), std.get()
+        return float(mean[0, 0]), float(std[0, 0])
+
+    @staticmethod
+    def _scaled_size(width: int, height: int, max_width: int) -> Tuple[int, int]:
+        """(width, height) of an image downscaled to at most `max_width` pixels wide"""
+        if width <= max_width:
+            return width, height
+        return max_width, max(1, height * max_width // width)
+
+    @staticmethod
+    def _resize(image, size: Tuple[int, int], current_size: Tuple[int, int]):
+        """Resize (INTER_AREA) an image or UMat from `current_size` to `size`"""
+        if size == current_size:
+            return image
+        return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+    @staticmethod
+    def _laplacian_variance(gray) -> float:
+        """Laplacian variance of a grayscale image or UMat"""
+        # The 3x3 response of uint8 input fits in int16
+        laplacian = cv2.Laplacian(gray, cv2.CV_16S)
+        _, std = ImageQualityChecker._mean_std(laplacian)
+        return std ** 2
+
+    @staticmethod
+    def _face_region(image: np.ndarray, face_bbox: Tuple[int, int, int, int]) -> Optional[np.ndarray]:
+        """Crop a frame to the face box clipped to the frame (None if empty)"""
+        height, width = image.shape[:2]
+        x1, y1, x2, y2 = face_bbox
+        x1, y1 = max(int(x1), 0), max(int(y1), 0)
+        x2, y2 = min(int(x2), width), min(int(y2), height)
+        if x2 <= x1 or y2 <= y1:
+            return None
+        return image[y1:y2, x1:x2]
 
     def check_blur(self, image: np.ndarray) -> Tuple[bool, float]:
         """
@@ -53,18 +129,14 @@ class ImageQualityChecker:
         Returns:
             Tuple of (is_sharp, blur_score)
         """
-        if len(image.shape) == 3:
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        else:
-            gray = image
-
-        # Calculate Laplacian variance
-        laplacian = cv2.Laplacian(gray, cv2.CV_64F)
-        blur_score = laplacian.var()
+        blur_score = self._laplacian_variance(self._to_gray(image))
+        return self._rate_blur(blur_score)
 
+    def _rate_blur(self, blur_score: float) -> Tuple[bool, float]:
+        """Compare a Laplacian variance against the blur threshold"""
         is_sharp = blur_score >= self.min_blur_threshold
 
-        logger.debug(f"Blur score: {blur_score:.2f}, Threshold: {self.min_blur_threshold}, Sharp: {is_sharp}")
+        logger.debug("Blur score: %.2f, Threshold: %s, Sharp: %s", blur_score, self.min_blur_threshold, is_sharp)
         return is_sharp, blur_score
 
     def check_brightness(self, image: np.ndarray) -> Tuple[bool, float]:
@@ -78,15 +150,15 @@ class ImageQualityChecker:
         Returns:
             Tuple of (is_good_brightness, brightness_value)
         """
-        if len(image.shape) == 3:
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        else:
-            gray = image
+        brightness, _ = self._mean_std(self._to_gray(image))
+        return self._rate_brightness(brightness)
 
-        brightness = np.mean(gray)
+    def _rate_brightness(self, brightness: float) -> Tuple[bool, float]:
+        """Compare a mean gray level against the brightness range"""
         is_good = self.min_brightness <= brightness <= self.max_brightness
 
-        logger.debug(f"Brightness: {brightness:.2f}, Range: [{self.min_brightness}, {self.max_brightness}], Good: {is_good}")
+        logger.debug("Brightness: %.2f, Range: [%s, %s], Good: %s",
+                     brightness, self.min_brightness, self.max_brightness, is_good)
         return is_good, brightness
 
     def check_contrast(self, image: np.ndarray) -> Tuple[bool, float]:
@@ -100,81 +172,94 @@ class ImageQualityChecker:
         Returns:
             Tuple of (has_good_contrast, contrast_value)
         """
-        if len(image.shape) == 3:
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        else:
-            gray = image
+        _, contrast = self._mean_std(self._to_gray(image))
+        return self._rate_contrast(contrast)
 
-        contrast = np.std(gray)
+    def _rate_contrast(self, contrast: float) -> Tuple[bool, float]:
+        """Compare a gray-level standard deviation against the contrast threshold"""
         has_good_contrast = contrast >= self.min_contrast
 
-        logger.debug(f"Contrast: {contrast:.2f}, Threshold: {self.min_contrast}, Good: {has_good_contrast}")
+        logger.debug("Contrast: %.2f, Threshold: %s, Good: %s", contrast, self.min_contrast, has_good_contrast)
         return has_good_contrast, contrast
 
-    def check_face_size(self, face_bbox: Tuple[int, int, int, int], frame_shape: Tuple[int, int]) -> Tuple[bool, float]:
+    @staticmethod
+    def _bbox_metrics(face_bbox: Tuple[int, int, int, int], frame_shape: Tuple[int, int]) -> Tuple[float, float]:
         """
-        Check if face size is appropriate
+        Compute the face size and centering metrics in one pass
 
         Args:
             face_bbox: Face bounding box (x1, y1, x2, y2)
             frame_shape: Frame shape (height, width)
 
         Returns:
-            Tuple of (is_good_size, face_area_ratio)
+            Tuple of (face_area_ratio, center_offset_ratio)
         """
-        x1, y1, x2, y2 = face_bbox
+        x1, y1, x2, y2 = (float(v) for v in face_bbox[:4])
         height, width = frame_shape[:2]
 
-        face_width = x2 - x1
-        face_height = y2 - y1
-        face_area = face_width * face_height
-        frame_area = height * width
+        area_ratio = (x2 - x1) * (y2 - y1) / (width * height)
+
+        # Offset of the face center from the frame center, as a ratio of each dimension
+        offset_x = abs((x1 + x2) - width) / (2 * width)
+        offset_y = abs((y1 + y2) - height) / (2 * height)
 
-        area_ratio = face_area / frame_area
+        return area_ratio, max(offset_x, offset_y)
 
+    def _rate_face_size(self, area_ratio: float) -> Tuple[bool, float]:
+        """Compare a face area ratio against the size range"""
         is_good_size = self.min_face_size <= area_ratio <= self.max_face_size
 
-        logger.debug(f"Face area ratio: {area_ratio:.3f}, Range: [{self.min_face_size}, {self.max_face_size}], Good: {is_good_size}")
+        logger.debug("Face area ratio: %.3f, Range: [%s, %s], Good: %s",
+                     area_ratio, self.min_face_size, self.max_face_size, is_good_size)
         return is_good_size, area_ratio
 
-    def check_face_centering(self, face_bbox: Tuple[int, int, int, int], frame_shape: Tuple[int, int]) -> Tuple[bool, float]:
+    def _rate_centering(self, offset: float) -> Tuple[bool, float]:
+        """Compare a center offset ratio against the allowed offset"""
+        is_centered = offset <= self.max_center_offset
+
+        logger.debug("Center offset: %.3f, Threshold: %s, Centered: %s",
+                     offset, self.max_center_offset, is_centered)
+        return is_centered, offset
+
+    def check_face_size(self, face_bbox: Tuple[int, int, int, int], frame_shape: Tuple[int, int]) -> Tuple[bool, float]:
         """
-        Check if face is centered in frame
+        Check if face size is appropriate
 
         Args:
             face_bbox: Face bounding box (x1, y1, x2, y2)
             frame_shape: Frame shape (height, width)
 
         Returns:
-            Tuple of (is_centered, offset_ratio)
+            Tuple of (is_good_size, face_area_ratio)
         """
-        x1, y1, x2, y2 = face_bbox
-        height, width = frame_shape[:2]
-
-        # Calculate face center
-        face_center_x = (x1 + x2) / 2
-        face_center_y = (y1 + y2) / 2
+        area_ratio, _ = self._bbox_metrics(face_bbox, frame_shape)
+        return self._rate_face_size(area_ratio)
 
-        # Calculate frame center
-        frame_center_x = width / 2
-        frame_center_y = height / 2
-
-        # Calculate offset as ratio of frame dimensions
-        offset_x = abs(face_center_x - frame_center_x) / width
-        offset_y = abs(face_center_y - frame_center_y) / height
+    def check_face_centering(self, face_bbox: Tuple[int, int, int, int], frame_shape: Tuple[int, int]) -> Tuple[bool, float]:
+        """
+        Check if face is centered in frame
 
-        max_offset = max(offset_x, offset_y)
-        is_centered = max_offset <= self.max_center_offset
+        Args:
+            face_bbox: Face bounding box (x1, y1, x2, y2)
+            frame_shape: Frame shape (height, width)
 
-        logger.debug(f"Center offset: {max_offset:.3f}, Threshold: {self.max_center_offset}, Centered: {is_centered}")
-        return is_centered, max_offset
+        Returns:
+            Tuple of (is_centered, offset_ratio)
+        """
+        _, offset = self._bbox_metrics(face_bbox, frame_shape)
+        return self._rate_centering(offset)
 
-    def check_occlusion(self, landmarks: np.ndarray) -> Tuple[bool, str]:
+    def check_occlusion(
+        self,
+        landmarks: np.ndarray,
+        face_bbox: Tuple[int, int, int, int] = None
+    ) -> Tuple[bool, str]:
         """
         Check if face features are visible (eyes, nose, mouth)
 
         Args:
             landmarks: Face landmarks (5 points: left_eye, right_eye, nose, left_mouth, right_mouth)
+            face_bbox: Optional face bounding box (x1, y1, x2, y2) the landmarks must lie in
 
         Returns:
             Tuple of (is_visible, message)
@@ -184,9 +269,20 @@ class ImageQualityChecker:
 
         # InsightFace provides 5 keypoints in order:
         # 0: left eye, 1: right eye, 2: nose, 3: left mouth corner, 4: right mouth corner
+        points = np.asarray(landmarks[:5])
+
+        if face_bbox is not None:
+            x1, y1, x2, y2 = face_bbox
+
+            # All keypoints must fall inside the face box; the detector places
+            # hidden features outside it or collapses them together
+            xs, ys = points[:, 0], points[:, 1]
+            if not np.all((xs >= x1) & (xs <= x2) & (ys >= y1) & (ys <= y2)):
+                return False, "Face partly hidden - show your whole face"
 
-        # Check if all landmarks are within reasonable bounds
-        # (This is a simple check - more sophisticated checks could be added)
+            eye_distance = float(np.linalg.norm(points[1] - points[0]))
+            if eye_distance < MIN_EYE_DISTANCE_RATIO * (x2 - x1):
+                return False, "Eyes not clearly visible"
 
         return True, "All features visible"
 
@@ -194,15 +290,22 @@ class ImageQualityChecker:
         self,
         image: np.ndarray,
         face_bbox: Tuple[int, int, int, int] = None,
-        landmarks: np.ndarray = None
+        landmarks: np.ndarray = None,
+        fast_fail: bool = True,
+        gray: Optional[np.ndarray] = None
     ) -> Dict:
         """
         Perform all quality checks
 
+        Checks run cheapest first: face geometry and landmarks, then the
+        brightness/contrast statistics, then the Laplacian blur check.
+
         Args:
             image: Input image (BGR)
             face_bbox: Optional face bounding box (x1, y1, x2, y2)
             landmarks: Optional face landmarks
+            fast_fail: Stop after the first stage that fails instead of running every check
+            gray: Optional grayscale version of `image` the caller already has; skips the conversion
 
         Returns:
             Dictionary with all quality check results
@@ -213,34 +316,12 @@ class ImageQualityChecker:
             'checks': {}
         }
 
-        # Blur check
-        is_sharp, blur_score = self.check_blur(image)
-        results['checks']['blur'] = {'pass': is_sharp, 'score': blur_score}
-        if not is_sharp:
-            results['overall_pass'] = False
-            results['feedback_messages'].append("BLURRY - hold still")
-
-        # Brightness check
-        is_bright, brightness = self.check_brightness(image)
-        results['checks']['brightness'] = {'pass': is_bright, 'score': brightness}
-        if not is_bright:
-            results['overall_pass'] = False
-            if brightness < self.min_brightness:
-                results['feedback_messages'].append("TOO DARK - add light")
-            else:
-                results['feedback_messages'].append("TOO BRIGHT - reduce light")
-
-        # Contrast check (critical for West African faces)
-        has_contrast, contrast = self.check_contrast(image)
-        results['checks']['contrast'] = {'pass': has_contrast, 'score': contrast}
-        if not has_contrast:
-            results['overall_pass'] = False
-            results['feedback_messages'].append("LOW CONTRAST - adjust lighting")
-
-        # Face-specific checks
+        # Face-specific checks (pure arithmetic, one pass over the box)
         if face_bbox is not None:
+            area_ratio, offset = self._bbox_metrics(face_bbox, image.shape)
+
             # Face size check
-            is_good_size, area_ratio = self.check_face_size(face_bbox, image.shape)
+            is_good_size, area_ratio = self._rate_face_size(area_ratio)
             results['checks']['face_size'] = {'pass': is_good_size, 'score': area_ratio}
             if not is_good_size:
                 results['overall_pass'] = False
@@ -250,7 +331,7 @@ class ImageQualityChecker:
                     results['feedback_messages'].append("Move BACK")
 
             # Face centering check
-            is_centered, offset = self.check_face_centering(face_bbox, image.shape)
+            is_centered, offset = self._rate_centering(offset)
             results['checks']['centering'] = {'pass': is_centered, 'score': offset}
             if not is_centered:
                 results['overall_pass'] = False
@@ -258,17 +339,88 @@ class ImageQualityChecker:
 
         # Occlusion check
         if landmarks is not None:
-            is_visible, msg = self.check_occlusion(landmarks)
+            is_visible, msg = self.check_occlusion(landmarks, face_bbox)
             results['checks']['occlusion'] = {'pass': is_visible, 'message': msg}
             if not is_visible:
                 results['overall_pass'] = False
                 results['feedback_messages'].append(msg)
 
-        # Calculate overall quality score (0-100)
-        total_checks = len(results['checks'])
+        # Pixel checks (grayscale statistics, then blur)
+        if results['overall_pass'] or not fast_fail:
+            self._check_pixels(gray if gray is not None else image, face_bbox, results, fast_fail)
+
+        # Calculate overall quality score (0-100); checks skipped by fast_fail count as
+        # failed so the score is always out of every check that applies to this frame
+        total_checks = len(PIXEL_CHECKS)
+        if face_bbox is not None:
+            total_checks += 2  # face_size, centering
+        if landmarks is not None:
+            total_checks += 1  # occlusion
         passed_checks = sum(1 for check in results['checks'].values() if check.get('pass', False))
         results['quality_score'] = (passed_checks / total_checks * 100) if total_checks > 0 else 0
 
         logger.info(f"Quality check: {results['quality_score']:.1f}% ({passed_checks}/{total_checks} passed)")
 
         return results
+
+    def _check_pixels(
+        self,
+        image: np.ndarray,
+        face_bbox: Optional[Tuple[int, int, int, int]],
+        results: Dict,
+        fast_fail: bool
+    ):
+        """Run the brightness, contrast and blur checks, recording into `results`"""
+        # With use_face_region, pixel checks run on the face region when it is known;
+        # background sharpness and lighting are irrelevant to the face embedding.
+        # Cropping before the conversion means only face pixels are converted
+        face_region = None
+        if self.use_face_region and face_bbox is not None:
+            face_region = self._face_region(image, face_bbox)
+        region = face_region if face_region is not None else image
+
+        # Sizes are worked out on the host; a UMat does not expose its shape
+        height, width = region.shape[:2]
+        is_color = region.ndim == 3
+        if self.use_opencl:
+            region = cv2.UMat(region)
+
+        # Convert once (no-op for grayscale input) and share it across the pixel checks;
+        # aggregate statistics do not need more than QUALITY_CHECK_WIDTH pixels across
+        gray = cv2.cvtColor(region, cv2.COLOR_BGR2GRAY) if is_color else region
+        gray_size = self._scaled_size(width, height, QUALITY_CHECK_WIDTH)
+        gray = self._resize(gray, gray_size, (width, height))
+
+        # Brightness and contrast come from a single meanStdDev pass
+        mean, std = self._mean_std(gray)
+
+        # Brightness check
+        is_bright, brightness = self._rate_brightness(mean)
+        results['checks']['brightness'] = {'pass': is_bright, 'score': brightness}
+        if not is_bright:
+            results['overall_pass'] = False
+            if brightness < self.min_brightness:
+                results['feedback_messages'].append("TOO DARK - add light")
+            else:
+                results['feedback_messages'].append("TOO BRIGHT - reduce light")
+
+        # Contrast check (critical for West African faces)
+        has_contrast, contrast = self._rate_contrast(std)
+        results['checks']['contrast'] = {'pass': has_contrast, 'score': contrast}
+        if not has_contrast:
+            results['overall_pass'] = False
+            results['feedback_messages'].append("LOW CONTRAST - adjust lighting")
+
+        # The Laplacian is the most expensive check; skip it once the frame has failed
+        if fast_fail and not results['overall_pass']:
+            return
+
+        # Blur check (whole frames are downscaled further)
+        blur_region = gray
+        if face_region is None:
+            blur_region = self._resize(gray, self._scaled_size(*gray_size, BLUR_CHECK_WIDTH), gray_size)
+        is_sharp, blur_score = self._rate_blur(self._laplacian_variance(blur_region))
+        results['checks']['blur'] = {'pass': is_sharp, 'score': blur_score}
+        if not is_sharp:
+            results['overall_pass'] = False
+            results['feedback_messages'].append("BLURRY - hold still")